@@ -16,4 +16,9 @@ else:
 "
 fi
 
+if [ "$SERVER" = "asgi" ]; then
+    # One asyncio worker holds every push connection; the in-process event broker needs that.
+    exec uvicorn find_home.asgi:application --host 0.0.0.0 --port ${PORT:-8000} --proxy-headers --forwarded-allow-ips='*'
+fi
+
 exec gunicorn find_home.wsgi --workers 2 --bind 0.0.0.0:${PORT:-8000}
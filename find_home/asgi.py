@@ -13,4 +13,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'find_home.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from home.events import events_app  # noqa: E402  (needs the app registry)
+
+
+async def application(scope, receive, send):
+    # Long-lived event streams skip Django's request cycle entirely.
+    if scope['type'] == 'http' and scope['path'] == '/events/':
+        await events_app(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
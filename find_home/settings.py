@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 import dj_database_url
 
@@ -35,6 +36,7 @@ CLOUDINARY_STORAGE = {
 }
 
 MIDDLEWARE = [
+    'home.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -50,7 +52,8 @@ WSGI_APPLICATION = 'find_home.wsgi.application'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's own backend, timing renders for home.metrics.
+        'BACKEND': 'home.metrics.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -88,6 +91,104 @@ if _static_dir.exists():
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Listing photos are staged on local disk and uploaded by a thread pool;
+# see home/images.py. Use home.images.LocalImageStorage to work offline,
+# and 0 workers to upload inline when the transaction commits. Staged files
+# are unvalidated uploads, so keep the staging root outside MEDIA_ROOT,
+# where nothing serves them.
+HOME_IMAGE_STORAGE = os.environ.get('HOME_IMAGE_STORAGE', 'home.images.CloudinaryImageStorage')
+HOME_IMAGE_STAGING_ROOT = os.environ.get('HOME_IMAGE_STAGING_ROOT', BASE_DIR / 'var' / 'staging')
+HOME_IMAGE_UPLOAD_WORKERS = int(os.environ.get('HOME_IMAGE_UPLOAD_WORKERS', 4))
+
+# Pub/sub used to push chat and interest events to /events/ (ASGI only).
+# The in-process broker needs a single worker; see home/events.py.
+HOME_EVENT_BROKER = os.environ.get('HOME_EVENT_BROKER', 'home.events.InProcessBroker')
+
+# Listings with this many unresolved reports are hidden until an admin acts
+# (0 turns automatic hiding off). Removed listings are deleted after the
+# request on a background thread; see home/moderation.py.
+HOME_REPORT_HIDE_THRESHOLD = int(os.environ.get('HOME_REPORT_HIDE_THRESHOLD', 5))
+HOME_PURGE_IN_BACKGROUND = os.environ.get('HOME_PURGE_IN_BACKGROUND', 'True') == 'True'
+
+# Token-bucket limits on the views that write on every POST, per user and per
+# client address; see home/throttle.py. Behind a reverse proxy set
+# HOME_THROTTLE_PROXY_COUNT to the number of proxies that append to
+# X-Forwarded-For (render.yaml sets 1). At 0 the header is ignored and
+# REMOTE_ADDR used; requests with fewer hops than the setting are limited
+# per user only.
+HOME_THROTTLE_ENABLED = os.environ.get('HOME_THROTTLE_ENABLED', 'True') == 'True'
+HOME_THROTTLE_PROXY_COUNT = int(os.environ.get('HOME_THROTTLE_PROXY_COUNT', 0))
+HOME_THROTTLE_RATES = {
+    'chat': {'user': '30/min', 'ip': '120/min'},
+    'comment': {'user': '10/min', 'ip': '40/min'},
+    'report': {'user': '10/hour', 'ip': '30/hour'},
+    'save': {'user': '60/min', 'ip': '240/min'},
+    'interest': {'user': '30/hour', 'ip': '120/hour'},
+}
+
+# Request metrics served at /metrics; see home/metrics.py. Each worker
+# flushes to its own file in HOME_METRICS_DIR, so every worker must share
+# it. Set HOME_METRICS_TOKEN to let Prometheus scrape with a bearer token
+# (admins can always view it), and HOME_METRICS_SLOW_QUERY_MS to log slow SQL.
+HOME_METRICS_DIR = os.environ.get('HOME_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'find_home_metrics'))
+HOME_METRICS_FLUSH_SECONDS = float(os.environ.get('HOME_METRICS_FLUSH_SECONDS', 10))
+HOME_METRICS_SLOW_QUERY_MS = float(os.environ.get('HOME_METRICS_SLOW_QUERY_MS', 0))
+HOME_METRICS_TOKEN = os.environ.get('HOME_METRICS_TOKEN', '')
+
+# Area suggestions are served from a per-worker index, rebuilt this often to
+# pick up other workers' changes; see home/autocomplete.py.
+HOME_AUTOCOMPLETE_MAX_AGE = float(os.environ.get('HOME_AUTOCOMPLETE_MAX_AGE', 300))
+
+# Listing search result pages are cached here; see home/search_cache.py.
+# LocMemCache is an LRU per process; point the alias at a shared backend
+# (e.g. Redis) to share pages and hit/miss counters between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': os.environ.get('SEARCH_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SEARCH_CACHE_LOCATION', 'home-search'),
+        'TIMEOUT': int(os.environ.get('SEARCH_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Rendered listing cards ({% cache %} in templates/listings/); keys are
+    # versioned by the listing's updated_at and cover image, so a long TTL is safe.
+    'template_fragments': {
+        'BACKEND': os.environ.get('FRAGMENT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', 'home-fragments'),
+        'TIMEOUT': 86400,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Logged-in users with their profiles; see home/profiles.py. Per-process
+    # entries can be TIMEOUT seconds stale in other workers, so use a shared
+    # backend where deactivations must apply at once.
+    'profiles': {
+        'BACKEND': os.environ.get('PROFILE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('PROFILE_CACHE_LOCATION', 'home-profiles'),
+        'TIMEOUT': int(os.environ.get('PROFILE_CACHE_TIMEOUT', 60)),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Rate-limit buckets; see home/throttle.py. Per process by default, so
+    # each worker allows the full rate; share it to limit across workers.
+    'throttle': {
+        'BACKEND': os.environ.get('THROTTLE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('THROTTLE_CACHE_LOCATION', 'home-throttle'),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+SEARCH_CACHE = 'search'
+PROFILE_CACHE = 'profiles'
+THROTTLE_CACHE = 'throttle'
+
+AUTHENTICATION_BACKENDS = ['home.profiles.ProfileBackend']
+
+# Sessions are stored in the database, so logging out or changing a password
+# revokes them. SESSION_ENGINE=django.contrib.sessions.backends.signed_cookies
+# saves the session query per request, but existing sessions are lost on the
+# switch and a copied cookie stays valid until it expires.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = '/'
@@ -0,0 +1,158 @@
+"""Area suggestions for the search box.
+
+Each worker keeps the distinct ``HouseListing.area`` values of searchable
+listings (available and not reported) in memory: a dict from the
+normalised name to its label and listing count, and the same names in a
+sorted list. A prefix is answered by bisecting that list and taking its
+busiest matches, so no query runs per keystroke. Prefixes that match many
+areas (the first letter or two) remember their answer, which is kept up
+to date as counts grow and dropped when one of its areas loses listings.
+
+The index is built with one grouped query on first use. Listing saves and
+deletes in this process adjust it in place (see home.signals); changes
+made by other workers, management commands or ``QuerySet.update()``
+appear when it is rebuilt, ``HOME_AUTOCOMPLETE_MAX_AGE`` seconds after it
+was built.
+
+Memory: an area of about a dozen characters costs some 180 bytes (the
+key and label strings, its dict slot and [label, count] list, and a list
+pointer), so 100,000 distinct areas take roughly 18 MB per worker. The
+remembered answers add at most one short list per ``MEMO_THRESHOLD``
+areas for each prefix length. Lookups take a few microseconds once
+remembered and about 3 ms for a single letter over 100,000 areas the
+first time.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.functions import Trim
+
+from .models import HouseListing
+
+SUGGESTIONS = 8
+# Prefixes matching more areas than this have their suggestions remembered.
+MEMO_THRESHOLD = 64
+
+_lock = threading.Lock()
+_index = None
+
+
+def normalize(area):
+    """The index key of an area name: lower case with single spaces"""
+    return ' '.join((area or '').lower().split())
+
+
+class AreaIndex:
+    def __init__(self, areas):
+        # key -> [label, count]
+        self.areas = areas
+        self.keys = sorted(areas)
+        self.memo = {}
+        self.built = time.monotonic()
+
+    @classmethod
+    def build(cls):
+        """An index of every searchable listing's area, from one query"""
+        rows = (
+            HouseListing.objects.filter(status='available', is_reported=False)
+            .order_by().values_list(Trim('area')).annotate(count=Count('id'))
+        )
+        areas = {}
+        spellings = {}
+        for area, count in rows:
+            key = normalize(area)
+            if not key:
+                continue
+            entry = areas.setdefault(key, [area, 0])
+            entry[1] += count
+            # Label each area with its most used spelling.
+            spellings[(key, area)] = spellings.get((key, area), 0) + count
+            if spellings[(key, area)] > spellings.get((key, entry[0]), 0):
+                entry[0] = area
+        return cls(areas)
+
+    def suggest(self, prefix, limit=SUGGESTIONS):
+        """Up to ``limit`` (label, count) pairs for areas starting with ``prefix``, busiest first"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = self.memo.get(prefix)
+        if matches is None:
+            start = bisect.bisect_left(self.keys, prefix)
+            end = bisect.bisect_left(self.keys, prefix + '\U0010ffff', start)
+            matches = heapq.nsmallest(
+                SUGGESTIONS, self.keys[start:end], key=lambda key: (-self.areas[key][1], key),
+            )
+            if end - start > MEMO_THRESHOLD:
+                self.memo[prefix] = matches
+        return [tuple(self.areas[key]) for key in matches[:limit]]
+
+    def add(self, area, delta):
+        """Adjust the listing count of ``area`` by ``delta``"""
+        key = normalize(area)
+        if not key or not delta:
+            return
+        entry = self.areas.get(key)
+        if entry is None:
+            if delta < 0:
+                return
+            self.areas[key] = [area.strip(), delta]
+            bisect.insort(self.keys, key)
+        else:
+            entry[1] += delta
+            if entry[1] <= 0:
+                del self.areas[key]
+                del self.keys[bisect.bisect_left(self.keys, key)]
+        for end in range(1, len(key) + 1):
+            matches = self.memo.get(key[:end])
+            if matches is None:
+                continue
+            if delta > 0:
+                # A busier area can only climb, so remembered answers stay right.
+                matches = sorted(set(matches) | {key}, key=lambda match: (-self.areas[match][1], match))
+                self.memo[key[:end]] = matches[:SUGGESTIONS]
+            elif key in matches:
+                # Whatever replaces it is not remembered; work it out again next time.
+                del self.memo[key[:end]]
+
+
+def get_index():
+    """This worker's index, built or rebuilt if missing or older than HOME_AUTOCOMPLETE_MAX_AGE"""
+    global _index
+    index = _index
+    if index is None or time.monotonic() - index.built >= settings.HOME_AUTOCOMPLETE_MAX_AGE:
+        index = AreaIndex.build()
+        with _lock:
+            _index = index
+    return index
+
+
+def suggest(prefix, limit=SUGGESTIONS):
+    index = get_index()
+    with _lock:
+        return index.suggest(prefix, limit)
+
+
+def moved(before, after):
+    """Update the index for a listing whose searchable area went from ``before`` to ``after``
+
+    Each is the area name, or None when the listing was not searchable.
+    """
+    with _lock:
+        if _index is None or before == after:
+            return
+        if before is not None:
+            _index.add(before, -1)
+        if after is not None:
+            _index.add(after, 1)
+
+
+def reset():
+    """Forget the index; the next suggestion rebuilds it"""
+    global _index
+    with _lock:
+        _index = None
@@ -0,0 +1,79 @@
+"""Materialized totals for the admin dashboard.
+
+Signal handlers in home.signals adjust these rows in the same transaction
+as the change they count, so the dashboard reads every figure in one
+query instead of counting whole tables. ``rebuild`` recounts from
+scratch (``manage.py rebuild_counters``) if they ever drift, e.g. after
+raw SQL or ``QuerySet.update()`` calls that bypass signals.
+"""
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import PlatformCounter
+
+LISTINGS = 'listings'
+USERS = 'users'
+PENDING_REPORTS = 'pending_reports'
+
+# Admins are staff, not platform users.
+COUNTED_USER_TYPES = ('renter', 'owner')
+
+
+def listings_on(date):
+    """Counter of listings created on ``date``"""
+    return f'listings:{date.isoformat()}'
+
+
+def add(name, delta):
+    """Atomically adjust counter ``name`` by ``delta``"""
+    if not delta:
+        return
+    counters = PlatformCounter.objects.filter(name=name)
+    if not counters.update(value=F('value') + delta):
+        PlatformCounter.objects.get_or_create(name=name)
+        counters.update(value=F('value') + delta)
+
+
+def read(*names):
+    """Current values of ``names`` in one query; missing counters read as 0"""
+    values = dict(PlatformCounter.objects.filter(name__in=names).values_list('name', 'value'))
+    return {name: values.get(name, 0) for name in names}
+
+
+def dashboard_counts():
+    """The admin dashboard's headline figures"""
+    today = listings_on(timezone.localdate())
+    values = read(LISTINGS, USERS, PENDING_REPORTS, today)
+    return {
+        'total_listings': values[LISTINGS],
+        'total_users': values[USERS],
+        'pending_reports': values[PENDING_REPORTS],
+        'new_listings_today': values[today],
+    }
+
+
+def rebuild(apps=global_apps):
+    """Recount every counter from the source tables; returns the new values"""
+    HouseListing = apps.get_model('home', 'HouseListing')
+    UserProfile = apps.get_model('home', 'UserProfile')
+    Report = apps.get_model('home', 'Report')
+    Counter = apps.get_model('home', 'PlatformCounter')
+
+    with transaction.atomic():
+        values = {
+            LISTINGS: HouseListing.objects.count(),
+            USERS: UserProfile.objects.filter(user_type__in=COUNTED_USER_TYPES).count(),
+            PENDING_REPORTS: Report.objects.filter(is_resolved=False).count(),
+        }
+        daily = (
+            HouseListing.objects.annotate(day=TruncDate('created_at'))
+            .values('day').annotate(count=Count('id')).order_by()
+        )
+        for row in daily:
+            values[listings_on(row['day'])] = row['count']
+        Counter.objects.all().delete()
+        Counter.objects.bulk_create(Counter(name=name, value=value) for name, value in values.items())
+    return values
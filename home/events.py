@@ -0,0 +1,165 @@
+"""Publish/subscribe for pushing chat and interest notifications.
+
+Views publish small per-user events once their transaction commits, and
+``events_app`` streams them to connected browsers as server-sent events.
+Events are nudges: clients still fetch the data itself from the JSON
+endpoints, so a dropped event only delays an update until the next poll.
+
+``InProcessBroker`` only reaches subscribers in the same process, which
+suits a single ASGI worker. Point ``HOME_EVENT_BROKER`` at another class
+with the same ``subscribe``/``unsubscribe``/``publish`` methods to share
+events between processes.
+"""
+import asyncio
+import json
+import threading
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http.cookie import parse_cookie
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+
+HEARTBEAT_SECONDS = 15
+
+
+class InProcessBroker:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel):
+        """Queue receiving events published to ``channel``; call from the event loop"""
+        queue = asyncio.Queue(self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(channel, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            queues = self._subscribers.get(channel, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(channel, None)
+
+    def publish(self, channel, event):
+        """Deliver ``event`` to every subscriber of ``channel``; safe from any thread"""
+        with self._lock:
+            targets = list(self._subscribers.get(channel, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has closed; it will unsubscribe itself.
+                pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # A stalled client catches up from the JSON endpoints.
+        pass
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.HOME_EVENT_BROKER)()
+    return _broker
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def publish_to_user(user_id, event_type, data):
+    """Push an event to ``user_id`` once the current transaction commits"""
+    event = {'type': event_type, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(user_channel(user_id), event))
+
+
+def session_user_id(session_key):
+    """The active user id stored in session ``session_key``, or None"""
+    store = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user_id = store.get(SESSION_KEY)
+    if user_id is None:
+        return None
+    user = User.objects.filter(pk=user_id, is_active=True).only('password').first()
+    if user is None or not constant_time_compare(store.get(HASH_SESSION_KEY, ''), user.get_session_auth_hash()):
+        return None
+    return user.pk
+
+
+async def events_app(scope, receive, send):
+    """Bare ASGI app streaming the session user's events as server-sent events.
+
+    find_home.asgi routes ``/events/`` here ahead of Django, so an idle
+    connection costs one parked task rather than a request passing through
+    the whole middleware stack.
+    """
+    cookies = parse_cookie(dict(scope['headers']).get(b'cookie', b'').decode('latin-1'))
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    user_id = await sync_to_async(session_user_id)(session_key) if session_key else None
+    if user_id is None:
+        await send({
+            'type': 'http.response.start', 'status': 401,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await send({'type': 'http.response.body', 'body': b'{"error": "Login required."}'})
+        return
+
+    broker = get_broker()
+    channel = user_channel(user_id)
+    queue = broker.subscribe(channel)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    pending = None
+    try:
+        await send({
+            'type': 'http.response.start', 'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-store'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        chunk = f'retry: {HEARTBEAT_SECONDS * 1000}\n: connected\n\n'
+        while True:
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            pending = pending or asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {pending, disconnect}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                break
+            if pending in done:
+                event = pending.result()
+                pending = None
+                chunk = f'event: {event["type"]}\ndata: {json.dumps(event["data"])}\n\n'
+            else:
+                chunk = ': keep-alive\n\n'
+    except OSError:
+        # Client went away while we were writing.
+        pass
+    finally:
+        disconnect.cancel()
+        if pending:
+            pending.cancel()
+        broker.unsubscribe(channel, queue)
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
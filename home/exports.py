@@ -0,0 +1,105 @@
+"""Streaming CSV/JSONL exports of listings, reports and chat messages.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` (a server-side
+cursor on PostgreSQL) and encoded one at a time, so memory stays flat no
+matter how many rows match. Filters use the same query parameters as the
+Django admin changelist filters, e.g. ``?status__exact=available`` or
+``?created_at__gte=2025-01-01&created_at__lt=2025-02-01``. CSV cells
+that a spreadsheet would run as formulas are quoted; JSONL is left as is.
+"""
+import csv
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .models import ChatMessage, HouseListing, Report
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+# Spreadsheets run cells starting with these as formulas.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Export:
+    def __init__(self, model, columns, exact=(), date_field=None):
+        self.model = model
+        self.columns = columns
+        self.exact = exact
+        self.date_field = date_field
+
+    def filter_names(self):
+        names = [f'{name}__exact' for name in self.exact]
+        if self.date_field:
+            names += [f'{self.date_field}__gte', f'{self.date_field}__lt']
+        return names
+
+    def queryset(self, params):
+        """Rows matching admin-style filter ``params``; raises ValidationError for bad values"""
+        filters = {}
+        for name in self.filter_names():
+            value = params.get(name)
+            if value in (None, ''):
+                continue
+            field = self.model._meta.get_field(name.split('__')[0])
+            try:
+                value = field.to_python(value)
+            except ValidationError as e:
+                raise ValidationError({name: e.messages})
+            if isinstance(value, datetime) and timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            filters[name] = value
+        unknown = set(params) - set(self.filter_names())
+        if unknown:
+            raise ValidationError({name: ['Unknown filter.'] for name in sorted(unknown)})
+        return self.model.objects.filter(**filters).order_by('pk').values_list(*self.columns)
+
+    def rows(self, params):
+        return self.queryset(params).iterator(chunk_size=CHUNK_SIZE)
+
+
+EXPORTS = {
+    'listings': Export(
+        HouseListing,
+        ['id', 'title', 'owner__username', 'house_type', 'area', 'address', 'rent', 'status',
+         'is_reported', 'contact_phone', 'contact_email', 'created_at', 'updated_at'],
+        exact=['house_type', 'status', 'is_reported'], date_field='created_at',
+    ),
+    'reports': Export(
+        Report,
+        ['id', 'listing_id', 'listing__title', 'reporter__username', 'reason', 'is_resolved', 'created_at'],
+        exact=['is_resolved'], date_field='created_at',
+    ),
+    'chat': Export(
+        ChatMessage,
+        ['id', 'listing_id', 'sender__username', 'receiver__username', 'message', 'is_read', 'timestamp'],
+        exact=['listing', 'is_read'], date_field='timestamp',
+    ),
+}
+
+
+def spreadsheet_safe(value):
+    """``value``, with text that a spreadsheet would run as a formula prefixed by a quote"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands back what it is given"""
+
+    def write(self, value):
+        return value
+
+
+def encode(export, rows, fmt):
+    """Yield the header (CSV only) and then one encoded line per row"""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(export.columns)
+        for row in rows:
+            yield writer.writerow([spreadsheet_safe(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(export.columns, row)), default=str) + '\n'
@@ -0,0 +1,85 @@
+"""Result counts per house type, rent bracket and area for the search UI.
+
+All three come from one grouped query over the current search with the
+type and rent filters lifted: rows are grouped by house type, rent
+bracket, area and whether the rent passes the rent filter, and Python
+rolls those few rows up. Each facet is counted with every filter except
+its own, so picking "Family" still shows what the other types would give.
+The rows passing every filter add up to the total number of results, so
+the result count costs no query of its own.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, Count, Q, Value, When
+from django.db.models.functions import Lower, Trim
+
+from .models import HouseListing
+from .search import filter_listings
+
+# Upper bounds of the rent brackets, in taka; the last bracket is open.
+RENT_BRACKETS = (5000, 10000, 20000, 40000)
+TOP_AREAS = 8
+
+
+def rent_brackets():
+    """(min_rent, max_rent, label) of every bracket; max_rent is None for the open one"""
+    brackets = []
+    low = 0
+    for high in RENT_BRACKETS + (None,):
+        if high is None:
+            brackets.append((low, None, f'৳{low:,}+'))
+        else:
+            # Search rent filters are inclusive, so a bracket ends just below the next one.
+            label = f'Under ৳{high:,}' if not low else f'৳{low:,}–{high - 1:,}'
+            brackets.append((low, high - Decimal('0.01'), label))
+        low = high
+    return brackets
+
+
+def _bracket_expression():
+    whens = [When(rent__lt=high, then=Value(index)) for index, high in enumerate(RENT_BRACKETS)]
+    return Case(*whens, default=Value(len(RENT_BRACKETS)))
+
+
+def facet_counts(data):
+    """Facet counts for cleaned ``SearchForm`` data, as lists ready for the template"""
+    house_type, min_rent, max_rent = data.get('house_type'), data.get('min_rent'), data.get('max_rent')
+    base = filter_listings({**data, 'house_type': '', 'min_rent': None, 'max_rent': None, 'sort': ''})
+    rent_filter = Q()
+    if min_rent:
+        rent_filter &= Q(rent__gte=min_rent)
+    if max_rent:
+        rent_filter &= Q(rent__lte=max_rent)
+    rows = (
+        base.order_by()
+        .annotate(
+            bracket=_bracket_expression(),
+            area_key=Lower(Trim('area')),
+            rent_ok=Case(When(rent_filter, then=Value(True)), default=Value(False)) if rent_filter else Value(True),
+        )
+        .values('house_type', 'bracket', 'area_key', 'rent_ok')
+        .annotate(count=Count('id'))
+    )
+
+    types = {}
+    brackets = dict.fromkeys(range(len(RENT_BRACKETS) + 1), 0)
+    areas = {}
+    total = 0
+    for row in rows:
+        type_ok = not house_type or row['house_type'] == house_type
+        if type_ok and row['rent_ok']:
+            total += row['count']
+        if row['rent_ok']:
+            types[row['house_type']] = types.get(row['house_type'], 0) + row['count']
+        if type_ok:
+            brackets[row['bracket']] += row['count']
+        if type_ok and row['rent_ok'] and row['area_key']:
+            areas[row['area_key']] = areas.get(row['area_key'], 0) + row['count']
+
+    top_areas = sorted(areas.items(), key=lambda item: (-item[1], item[0]))[:TOP_AREAS]
+    return {
+        'house_type': [(value, label, types.get(value, 0)) for value, label in HouseListing.HOUSE_TYPES],
+        'rent': [(low, high, label, brackets[index]) for index, (low, high, label) in enumerate(rent_brackets())],
+        'areas': [(area.title(), count) for area, count in top_areas],
+        'total': total,
+    }
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from . import geo
 from .models import UserProfile, HouseListing, HouseImage, Comment, Report
 
 class UserRegistrationForm(UserCreationForm):
@@ -22,11 +23,30 @@ class UserRegistrationForm(UserCreationForm):
 class HouseListingForm(forms.ModelForm):
     class Meta:
         model = HouseListing
-        fields = ['title', 'description', 'house_type', 'address', 'area', 'rent', 'contact_phone', 'contact_email']
+        fields = [
+            'title', 'description', 'house_type', 'address', 'area', 'rent', 'contact_phone', 'contact_email',
+            'latitude', 'longitude',
+        ]
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
             'address': forms.Textarea(attrs={'rows': 3}),
+            'latitude': forms.NumberInput(attrs={'step': 'any', 'min': -90, 'max': 90}),
+            'longitude': forms.NumberInput(attrs={'step': 'any', 'min': -180, 'max': 180}),
         }
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        latitude, longitude = cleaned_data.get('latitude'), cleaned_data.get('longitude')
+        if latitude is None and longitude is None:
+            # Without a pin, place the listing at the centre of its area when we know it.
+            location = geo.geocode_area(cleaned_data.get('area'))
+            if location:
+                cleaned_data['latitude'], cleaned_data['longitude'] = location
+        elif latitude is None or longitude is None:
+            raise forms.ValidationError('Enter both latitude and longitude, or neither.')
+        elif not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise forms.ValidationError('That is not a valid latitude and longitude.')
+        return cleaned_data
 
 class HouseImageForm(forms.ModelForm):
     class Meta:
@@ -41,10 +61,47 @@ class SearchForm(forms.Form):
         ('family', 'Family'),
     )
     
-    query = forms.CharField(max_length=100, required=False, widget=forms.TextInput(attrs={'placeholder': 'Search by area...'}))
+    query = forms.CharField(max_length=100, required=False, widget=forms.TextInput(attrs={'placeholder': 'Search by area...', 'list': 'area-suggestions', 'autocomplete': 'off'}))
     house_type = forms.ChoiceField(choices=HOUSE_TYPES, required=False)
     min_rent = forms.DecimalField(max_digits=10, decimal_places=2, required=False, widget=forms.NumberInput(attrs={'placeholder': 'Min. Rent'}))
     max_rent = forms.DecimalField(max_digits=10, decimal_places=2, required=False,  widget=forms.NumberInput(attrs={'placeholder': 'Max. Rent'}))
+    # Location search; see home.geo. bbox is "west,south,east,north" in degrees.
+    lat = forms.FloatField(required=False, min_value=-90, max_value=90, widget=forms.HiddenInput)
+    lng = forms.FloatField(required=False, min_value=-180, max_value=180, widget=forms.HiddenInput)
+    radius_km = forms.FloatField(
+        required=False, min_value=0.1, max_value=geo.MAX_RADIUS_KM,
+        widget=forms.NumberInput(attrs={'placeholder': 'Within km', 'step': 'any'}),
+    )
+    bbox = forms.CharField(required=False, widget=forms.HiddenInput)
+    sort = forms.ChoiceField(choices=(('', 'Newest'), ('distance', 'Nearest')), required=False)
+    
+    def clean_bbox(self):
+        value = self.cleaned_data['bbox']
+        if not value:
+            return None
+        try:
+            west, south, east, north = (float(part) for part in value.split(','))
+        except ValueError:
+            raise forms.ValidationError('Expected "west,south,east,north".')
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+            raise forms.ValidationError('That is not a valid bounding box.')
+        return tuple(round(value, 5) for value in (west, south, east, north))
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        lat, lng = cleaned_data.get('lat'), cleaned_data.get('lng')
+        if (lat is None) != (lng is None):
+            raise forms.ValidationError('Send both lat and lng.')
+        if lat is None:
+            cleaned_data['radius_km'] = None
+            if cleaned_data.get('sort') == 'distance':
+                cleaned_data['sort'] = ''
+        else:
+            # Rounded to about a metre, so nearby searches share cache entries.
+            cleaned_data['lat'], cleaned_data['lng'] = round(lat, 5), round(lng, 5)
+            # Distance searches are always bounded, so they never sort the whole table.
+            cleaned_data['radius_km'] = round(cleaned_data.get('radius_km') or geo.DEFAULT_RADIUS_KM, 2)
+        return cleaned_data
 
 class CommentForm(forms.ModelForm):
     class Meta:
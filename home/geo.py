@@ -0,0 +1,105 @@
+"""Location search over HouseListing latitude/longitude.
+
+Listings carry ``geo_row``, the index of the 0.01 degree (~1.1 km) band
+of latitude they fall in, and a partial index on ``(geo_row, longitude,
+latitude)``.
+A bounding box then becomes one short index range per band it crosses,
+``geo_row IN (...) AND longitude BETWEEN ...``, which SQLite and
+PostgreSQL both answer from a plain B-tree, so the cost follows the
+number of nearby listings rather than the size of the table.
+
+Distances use the equirectangular approximation: plain arithmetic that
+every backend can evaluate and sort by, and well under 1% off at city
+scale. Nearest-first searches sort the whole circle and page on the
+distance, so later pages skip the listings already shown.
+Listings without coordinates get them from ``AREA_CENTROIDS``,
+an offline table of neighbourhood centres.
+"""
+import math
+
+from django.db.models import ExpressionWrapper, F, FloatField
+
+ROWS_PER_DEGREE = 100
+KM_PER_DEGREE = 111.195
+# Boxes taller than this many bands filter on latitude instead of listing bands.
+MAX_ROWS = 200
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 50
+
+# Approximate centres of the neighbourhoods listings most often name.
+AREA_CENTROIDS = {
+    'adabor': (23.7740, 90.3560),
+    'agargaon': (23.7780, 90.3780),
+    'azimpur': (23.7270, 90.3850),
+    'badda': (23.7805, 90.4267),
+    'banani': (23.7940, 90.4043),
+    'baridhara': (23.8008, 90.4213),
+    'bashundhara': (23.8193, 90.4526),
+    'dhanmondi': (23.7461, 90.3742),
+    'farmgate': (23.7561, 90.3872),
+    'gulshan': (23.7925, 90.4078),
+    'kalabagan': (23.7500, 90.3820),
+    'khilgaon': (23.7515, 90.4290),
+    'lalbagh': (23.7190, 90.3880),
+    'malibagh': (23.7495, 90.4125),
+    'mirpur': (23.8223, 90.3654),
+    'mohakhali': (23.7781, 90.4005),
+    'mohammadpur': (23.7662, 90.3589),
+    'motijheel': (23.7330, 90.4172),
+    'rampura': (23.7612, 90.4208),
+    'shyamoli': (23.7746, 90.3657),
+    'tejgaon': (23.7639, 90.3925),
+    'uttara': (23.8759, 90.3795),
+    'wari': (23.7183, 90.4220),
+}
+
+
+def grid_row(latitude):
+    """The latitude band ``latitude`` falls in, or None"""
+    if latitude is None:
+        return None
+    return math.floor((latitude + 90) * ROWS_PER_DEGREE)
+
+
+def locate(listing):
+    """Keep ``listing.geo_row`` in step with its latitude"""
+    listing.geo_row = grid_row(listing.latitude)
+
+
+def geocode_area(area):
+    """(latitude, longitude) of a known neighbourhood name, or None"""
+    return AREA_CENTROIDS.get(' '.join((area or '').lower().split()))
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    dy = lat2 - lat1
+    dx = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(dx, dy) * KM_PER_DEGREE
+
+
+def within_bbox(queryset, south, west, north, east):
+    """Listings inside the box; boxes crossing the antimeridian are not supported"""
+    queryset = queryset.filter(
+        latitude__gte=south, latitude__lte=north, longitude__gte=west, longitude__lte=east,
+    )
+    rows = range(grid_row(south), grid_row(north) + 1)
+    if len(rows) <= MAX_ROWS:
+        queryset = queryset.filter(geo_row__in=list(rows))
+    return queryset
+
+
+def with_distance(queryset, lat, lng):
+    """Annotate ``distance_sq``, the squared distance from (lat, lng) in degrees of latitude"""
+    scale = math.cos(math.radians(lat))
+    dy = F('latitude') - lat
+    dx = (F('longitude') - lng) * scale
+    return queryset.annotate(distance_sq=ExpressionWrapper(dy * dy + dx * dx, output_field=FloatField()))
+
+
+def within_radius(queryset, lat, lng, radius_km):
+    """Listings within ``radius_km`` of (lat, lng), annotated with ``distance_sq``"""
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = dlat / max(math.cos(math.radians(lat)), 0.01)
+    queryset = within_bbox(queryset, lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+    return with_distance(queryset, lat, lng).filter(distance_sq__lte=dlat * dlat)
+
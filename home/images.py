@@ -0,0 +1,213 @@
+"""Background upload of listing photos.
+
+``stage_images`` checks each uploaded file is an image Pillow can read,
+writes it to a local staging directory and records a HouseImage in the
+"processing" state, so the request that created the listing returns
+without waiting on storage. Once the transaction commits, a thread pool
+pushes the staged files to the image storage concurrently and marks each
+image "ready" (or "failed").
+
+Each photo is also resized to ``VARIANT_WIDTHS`` (WebP where Pillow
+supports it) so pages can serve a thumbnail-sized file through the
+``image_src`` template tag (home.templatetags.listing_images) instead of
+the original.
+
+The storage is ``settings.HOME_IMAGE_STORAGE``: Cloudinary in production,
+or ``LocalImageStorage`` under MEDIA_ROOT for development and tests.
+Images left "processing" by a worker that died mid-upload are finished
+by ``manage.py finish_image_uploads``.
+"""
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, features
+from cloudinary import uploader
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from .models import HouseImage
+
+logger = logging.getLogger(__name__)
+
+# Widths of the resized copies made of every photo: dashboard thumbnails,
+# listing cards and the detail carousel, each with room for 2x screens.
+VARIANT_WIDTHS = (160, 480, 960)
+VARIANT_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+VARIANT_QUALITY = 80
+# Formats accepted for upload, with the extension each is staged under.
+UPLOAD_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif'}
+
+
+class CloudinaryImageStorage:
+    def upload(self, path):
+        return uploader.upload_resource(path, type='upload', resource_type='image')
+
+    def name(self, uploaded):
+        """The value ``upload`` returned, as stored in the database"""
+        return uploaded.get_prep_value()
+
+    def url(self, image):
+        return image.url
+
+
+class LocalImageStorage:
+    """Keeps images under MEDIA_ROOT so everything works offline"""
+
+    def __init__(self):
+        self.storage = FileSystemStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+
+    def upload(self, path):
+        with open(path, 'rb') as staged:
+            return self.storage.save(f'house_images/{os.path.basename(path)}', File(staged))
+
+    def name(self, uploaded):
+        return uploaded
+
+    def url(self, image):
+        name = f'{image.public_id}.{image.format}' if image.format else image.public_id
+        return self.storage.url(name)
+
+
+_storage = None
+_executor = None
+
+
+def get_image_storage():
+    global _storage
+    if _storage is None:
+        _storage = import_string(settings.HOME_IMAGE_STORAGE)()
+    return _storage
+
+
+def staging_storage():
+    return FileSystemStorage(location=settings.HOME_IMAGE_STAGING_ROOT)
+
+
+def image_extension(upload):
+    """The extension for the format Pillow detects in ``upload``, or None if it is not an accepted image"""
+    try:
+        with Image.open(upload) as image:
+            image.verify()
+            return UPLOAD_EXTENSIONS.get(image.format)
+    except Exception:
+        return None
+    finally:
+        upload.seek(0)
+
+
+def stage_images(listing, files):
+    """Save ``files`` locally as processing images of ``listing`` and queue their upload
+
+    The staged name takes its extension from the detected format, never the
+    client's file name; a file that is not an accepted image raises ValueError.
+    """
+    staging = staging_storage()
+    images = []
+    for upload in files:
+        extension = image_extension(upload)
+        if extension is None:
+            raise ValueError(f'{upload.name} is not a JPEG, PNG or GIF image')
+        name = staging.save(f'{uuid.uuid4().hex}{extension}', upload)
+        images.append(HouseImage(listing=listing, status='processing', staged_file=name))
+    images = HouseImage.objects.bulk_create(images)
+    ids = [image.pk for image in images]
+    transaction.on_commit(lambda: submit(ids))
+    return images
+
+
+def submit(image_ids):
+    """Upload staged images on the thread pool, or inline without workers"""
+    global _executor
+    workers = settings.HOME_IMAGE_UPLOAD_WORKERS
+    if not workers:
+        for image_id in image_ids:
+            process_image(image_id)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-upload')
+    for image_id in image_ids:
+        _executor.submit(_process_in_thread, image_id)
+
+
+def _process_in_thread(image_id):
+    try:
+        process_image(image_id)
+    finally:
+        connection.close()
+
+
+def process_image(image_id):
+    """Push one staged image to storage and mark it ready or failed"""
+    image = HouseImage.objects.filter(pk=image_id, status='processing').first()
+    if image is None:
+        # Already finished, or the listing was deleted meanwhile.
+        return
+    staging = staging_storage()
+    path = staging.path(image.staged_file)
+    try:
+        image.image = get_image_storage().upload(path)
+        image.status = 'ready'
+    except Exception:
+        logger.exception('Uploading image %s failed', image_id)
+        image.status = 'failed'
+    else:
+        image.variants = upload_variants(path)
+        staging.delete(image.staged_file)
+        image.staged_file = ''
+    image.save(update_fields=['image', 'variants', 'status', 'staged_file'])
+
+
+def make_variants(path):
+    """Write resized copies of the image at ``path`` beside it; returns {width: path}"""
+    stem = os.path.splitext(path)[0]
+    extension = '.webp' if VARIANT_FORMAT == 'WEBP' else '.jpg'
+    variants = {}
+    try:
+        _resize(path, stem, extension, variants)
+    except Exception:
+        for variant_path in variants.values():
+            if os.path.exists(variant_path):
+                os.remove(variant_path)
+        raise
+    return variants
+
+
+def _resize(path, stem, extension, variants):
+    with Image.open(path) as original:
+        source = ImageOps.exif_transpose(original)
+        if VARIANT_FORMAT == 'JPEG' or source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGB')
+        for width in VARIANT_WIDTHS:
+            # Never upscale: the smallest variant is made regardless, larger ones only from bigger originals.
+            if variants and width > source.width:
+                break
+            resized = source.copy()
+            resized.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+            variants[width] = f'{stem}_{width}{extension}'
+            resized.save(variants[width], VARIANT_FORMAT, quality=VARIANT_QUALITY)
+
+
+def upload_variants(path):
+    """Resize the image at ``path`` and upload each variant; returns {width: stored name}"""
+    try:
+        files = make_variants(path)
+    except Exception:
+        logger.warning('Could not make variants of %s', path, exc_info=True)
+        return {}
+    stored = {}
+    storage = get_image_storage()
+    try:
+        for width, variant_path in files.items():
+            stored[str(width)] = storage.name(storage.upload(variant_path))
+    except Exception:
+        logger.exception('Uploading variants of %s failed', path)
+        return {}
+    finally:
+        for variant_path in files.values():
+            os.remove(variant_path)
+    return stored
@@ -0,0 +1,48 @@
+"""Chat conversations for the inbox.
+
+A conversation is a listing plus the other person in its chat. One
+aggregate query groups the user's sent and received messages by both,
+giving the id of the latest message and the unread count of each
+conversation; it reads the sender index and ``chat_unread_idx`` without
+touching the table for received messages. Pages are keyed on that
+latest id, so a later page adds a HAVING condition rather than an OFFSET.
+The page's latest messages, with their listings and users, then come from
+one more query by id.
+"""
+from django.db.models import Case, Count, F, Max, Q, When
+
+from .models import ChatMessage
+from .pagination import CursorPaginator
+
+PER_PAGE = 20
+
+
+def conversations(user):
+    """``user``'s conversations as dicts, most recent first
+
+    Each has ``listing_id``, ``counterpart_id``, ``last_id`` (the latest
+    message) and ``unread`` (messages to ``user`` not yet read).
+    """
+    return (
+        ChatMessage.objects.filter(Q(sender=user) | Q(receiver=user))
+        .order_by()
+        .annotate(counterpart_id=Case(When(sender=user, then=F('receiver_id')), default=F('sender_id')))
+        .values('listing_id', 'counterpart_id')
+        .annotate(last_id=Max('id'), unread=Count('id', filter=Q(receiver=user, is_read=False)))
+        .order_by('-last_id')
+    )
+
+
+def get_page(user, cursor, per_page=PER_PAGE):
+    """A page of conversations, each with its latest ChatMessage as ``message``"""
+    page = CursorPaginator(conversations(user), per_page).get_page(cursor)
+    latest = ChatMessage.objects.select_related('listing__cover_image', 'sender', 'receiver').in_bulk(
+        [conversation['last_id'] for conversation in page]
+    )
+    # A conversation can vanish between the two queries if its listing is deleted.
+    page.object_list = [conversation for conversation in page if conversation['last_id'] in latest]
+    for conversation in page:
+        message = latest[conversation['last_id']]
+        conversation['message'] = message
+        conversation['counterpart'] = message.receiver if message.sender_id == user.id else message.sender
+    return page
@@ -0,0 +1,71 @@
+import statistics
+import time
+
+import cloudinary
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from home.forms import SearchForm
+from home.models import HouseImage, HouseListing
+from home.pagination import CursorPaginator
+
+UNCACHED = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+
+class Command(BaseCommand):
+    help = 'Time rendering a page of listing cards with and without the fragment cache. All data is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-page', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if not cloudinary.config().cloud_name:
+            # URLs are built locally; nothing is fetched from Cloudinary.
+            cloudinary.config(cloud_name='bench')
+        with transaction.atomic():
+            owner = User.objects.create(username='bench_cards_owner')
+            for i in range(options['per_page']):
+                listing = HouseListing.objects.create(
+                    owner=owner, title=f'Bench flat {i}', description='Synthetic benchmark listing ' * 5,
+                    house_type=HouseListing.HOUSE_TYPES[i % len(HouseListing.HOUSE_TYPES)][0],
+                    address=f'House {i}, Road 7', area='Dhanmondi', rent=10000 + i * 500,
+                    contact_phone='01700000000', contact_email='bench@example.com',
+                )
+                HouseImage.objects.create(listing=listing, image=f'house_images/bench_{listing.pk}')
+            listings = HouseListing.objects.filter(owner=owner).select_related('cover_image').order_by('-created_at', '-id')
+            page = CursorPaginator(listings, options['per_page']).get_page(None)
+
+            request = RequestFactory().get('/', HTTP_HOST='localhost')
+            request.user = AnonymousUser()
+            context = {'form': SearchForm(), 'listings': page}
+
+            def render():
+                render_to_string('home.html', context, request=request)
+
+            fragments = dict(caches.settings, template_fragments=UNCACHED)
+            with override_settings(CACHES=fragments):
+                before = self._time(render, options['repeat'])
+            caches['template_fragments'].clear()
+            render()
+            after = self._time(render, options['repeat'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'home.html with {options["per_page"]} cards, {options["repeat"]} renders')
+        self.stdout.write(f'{"":<12}{"p50":>10}{"p95":>10}')
+        self.stdout.write(f'{"uncached":<12}{before[0]:>8.2f}ms{before[1]:>8.2f}ms')
+        self.stdout.write(f'{"cached":<12}{after[0]:>8.2f}ms{after[1]:>8.2f}ms')
+
+    def _time(self, render, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
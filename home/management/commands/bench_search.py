@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from home.models import HouseListing
+from home.search import icontains_search, search_listings
+
+AREAS = [
+    'Dhanmondi', 'Gulshan', 'Banani', 'Mirpur', 'Uttara', 'Mohammadpur',
+    'Bashundhara', 'Badda', 'Rampura', 'Motijheel', 'Farmgate', 'Shyamoli',
+]
+WORDS = [
+    'bright', 'spacious', 'quiet', 'furnished', 'family', 'flat', 'studio',
+    'duplex', 'apartment', 'room', 'sublet', 'lakeview', 'corner', 'modern',
+]
+QUERIES = ['dhanmondi', 'gulsh', 'mirpur road', 'furnished flat', 'sector 7', 'nomatchatall']
+
+
+class Command(BaseCommand):
+    help = 'Compare indexed full-text search against the icontains scan. All data is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            owner = User.objects.create(username='bench_search_owner')
+            created = 0
+            for size in sorted(options['sizes']):
+                self._fill(owner, rng, created, size, options['batch_size'])
+                created = size
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                self._report(size, options['repeat'])
+            transaction.set_rollback(True)
+
+    def _fill(self, owner, rng, start, stop, batch_size):
+        self.stdout.write(f'Generating listings {start}..{stop}')
+        for offset in range(start, stop, batch_size):
+            batch = []
+            for i in range(offset, min(offset + batch_size, stop)):
+                area = rng.choice(AREAS)
+                batch.append(HouseListing(
+                    owner=owner,
+                    title=' '.join(rng.sample(WORDS, 3)).title(),
+                    description='Synthetic benchmark listing',
+                    house_type=rng.choice(HouseListing.HOUSE_TYPES)[0],
+                    address=f'House {i}, Road {rng.randint(1, 40)}, Sector {rng.randint(1, 18)}, {area}',
+                    area=area,
+                    rent=rng.randint(3000, 80000),
+                    contact_phone='01700000000',
+                    contact_email='bench@example.com',
+                ))
+            HouseListing.objects.bulk_create(batch, batch_size=batch_size)
+
+    def _report(self, size, repeat):
+        self.stdout.write(f'\n{size} listings ({connection.vendor})')
+        self.stdout.write(f'{"query":<16}{"icontains p50":>15}{"fts p50":>10}{"icontains p95":>15}{"fts p95":>10}')
+        base = HouseListing.objects.filter(status='available', is_reported=False)
+        for query in QUERIES:
+            scan = self._time(lambda: icontains_search(base, query).order_by('-created_at'), repeat)
+            fts = self._time(lambda: search_listings(base, query), repeat)
+            self.stdout.write(
+                f'{query:<16}{scan[0]:>13.1f}ms{fts[0]:>8.1f}ms{scan[1]:>13.1f}ms{fts[1]:>8.1f}ms'
+            )
+
+    def _time(self, build, repeat):
+        """Median and p95 in ms of a count plus the first 12-row page, like the home view"""
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset = build()
+            queryset.count()
+            list(queryset[:12])
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
@@ -0,0 +1,171 @@
+import json
+import statistics
+import time
+
+import cloudinary
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from home.models import ChatMessage, Comment, HouseListing
+
+DEFAULT_BASELINE = settings.BASE_DIR / 'perf_baseline.json'
+# p95 changes smaller than this are noise, whatever the percentage.
+NOISE_MS = 2
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main views through the test client against data from seed_perf, recording '
+        'query counts and latency percentiles, and compare them with a stored baseline. '
+        'Exits with an error when a view runs more queries than the baseline or its p95 '
+        'grew by more than --tolerance. All writes made by the views are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='perf', help='The --prefix given to seed_perf.')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Run just these scenarios.')
+        parser.add_argument('--cold', action='store_true', help='Clear the search and fragment caches before every request.')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 growth (0.25 = 25%%).')
+
+    def handle(self, *args, **options):
+        if not cloudinary.config().cloud_name:
+            # URLs are built locally; nothing is fetched from Cloudinary.
+            cloudinary.config(cloud_name='bench')
+        scenarios = self._scenarios(options['prefix'])
+        if options['only']:
+            unknown = set(options['only']) - {name for name, *_ in scenarios}
+            if unknown:
+                raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+            scenarios = [scenario for scenario in scenarios if scenario[0] in options['only']]
+
+        results = {}
+        with transaction.atomic():
+            for name, user, url, params in scenarios:
+                client = Client(HTTP_HOST='localhost')
+                if user is not None:
+                    client.force_login(user)
+                results[name] = self._measure(name, client, url, params, options)
+            transaction.set_rollback(True)
+
+        baseline = self._load(options['baseline'])
+        regressions = self._report(results, baseline, options['tolerance'])
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline to {options["baseline"]}'))
+        elif regressions:
+            raise CommandError(f'Slower than the baseline: {", ".join(regressions)}')
+
+    def _scenarios(self, prefix):
+        """(name, user, url, params) for each view, using the busiest seeded rows"""
+        users = {user.username: user for user in User.objects.filter(
+            username__in=[f'{prefix}_admin', f'{prefix}_owner_0', f'{prefix}_renter_0']
+        )}
+        admin, owner, renter = (users.get(f'{prefix}_{name}') for name in ('admin', 'owner_0', 'renter_0'))
+        if None in (admin, owner, renter):
+            raise CommandError(f'No seeded data with prefix {prefix!r}; run seed_perf first')
+
+        hot = (
+            Comment.objects.filter(listing__owner__username__startswith=f'{prefix}_')
+            .values('listing').annotate(count=Count('id')).order_by('-count').first()
+        )
+        chat = (
+            ChatMessage.objects.filter(listing__owner=owner, sender__username__startswith=f'{prefix}_renter_')
+            .values('listing', 'sender').annotate(count=Count('id')).order_by('-count').first()
+        )
+        if hot is None or chat is None:
+            raise CommandError('The seeded data has no comments or no chat with the busiest owner')
+        listing, chat_listing, chat_renter = hot['listing'], chat['listing'], User.objects.get(pk=chat['sender'])
+        page = HouseListing.objects.filter(status='available', is_reported=False).order_by('-created_at', '-id')
+        page_ids = ','.join(str(pk) for pk in page.values_list('pk', flat=True)[:12])
+
+        return [
+            ('home', None, reverse('home'), {}),
+            ('home_search', None, reverse('home'), {'query': 'gulshan', 'house_type': 'family', 'max_rent': 20000}),
+            ('home_nearby', None, reverse('home'), {'lat': 23.7461, 'lng': 90.3742, 'radius_km': 2, 'sort': 'distance'}),
+            ('listing_detail', None, reverse('listing_detail', args=[listing]), {}),
+            ('listing_detail_renter', renter, reverse('listing_detail', args=[listing]), {}),
+            ('listing_comments', None, reverse('listing_comments', args=[listing]), {}),
+            ('dashboard_renter', renter, reverse('dashboard'), {}),
+            ('dashboard_owner', owner, reverse('dashboard'), {}),
+            ('dashboard_admin', admin, reverse('dashboard'), {}),
+            ('chat_view_renter', chat_renter, reverse('chat_view', args=[chat_listing]), {}),
+            ('chat_view_owner', owner, reverse('chat_view', args=[chat_listing]), {'renter_id': chat_renter.pk}),
+            ('chat_updates', chat_renter, reverse('chat_updates', args=[chat_listing]), {'after': 0}),
+            ('inbox_owner', owner, reverse('chat_inbox'), {}),
+            ('inbox_renter', chat_renter, reverse('chat_inbox'), {}),
+            ('listing_state', renter, reverse('listing_state'), {'ids': page_ids}),
+        ]
+
+    def _measure(self, name, client, url, params, options):
+        fragments = caches['template_fragments']
+        search = caches[settings.SEARCH_CACHE]
+        samples = []
+        for i in range(options['warmup'] + options['repeat']):
+            if options['cold']:
+                fragments.clear()
+                search.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(url, params)
+                elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                raise CommandError(f'{name}: GET {url} answered {response.status_code}')
+            if i >= options['warmup']:
+                samples.append(elapsed)
+        samples.sort()
+        return {
+            'queries': len(queries),
+            'p50': round(statistics.median(samples), 2),
+            'p95': round(self._percentile(samples, 0.95), 2),
+            'p99': round(self._percentile(samples, 0.99), 2),
+        }
+
+    def _percentile(self, samples, fraction):
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _report(self, results, baseline, tolerance):
+        """Print results beside the baseline; returns the names of regressed scenarios"""
+        regressions = []
+        self.stdout.write(f'{"view":<24}{"queries":>12}{"p50":>20}{"p95":>20}{"p99":>10}')
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                queries = f'{result["queries"]}'
+                p50, p95 = f'{result["p50"]:.1f}ms', f'{result["p95"]:.1f}ms'
+                line = f'{name:<24}{queries:>12}{p50:>20}{p95:>20}{result["p99"]:>8.1f}ms'
+                self.stdout.write(line)
+                continue
+            queries = f'{before["queries"]}->{result["queries"]}'
+            p50 = f'{result["p50"]:.1f}ms ({self._change(before["p50"], result["p50"])})'
+            p95 = f'{result["p95"]:.1f}ms ({self._change(before["p95"], result["p95"])})'
+            line = f'{name:<24}{queries:>12}{p50:>20}{p95:>20}{result["p99"]:>8.1f}ms'
+            if result['queries'] > before['queries'] or (
+                result['p95'] > before['p95'] * (1 + tolerance) and result['p95'] - before['p95'] > NOISE_MS
+            ):
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        return regressions
+
+    def _change(self, before, after):
+        return f'{(after - before) / before:+.0%}' if before else 'n/a'
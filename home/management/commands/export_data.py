@@ -0,0 +1,41 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from home import exports
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream listings, reports or chat messages as CSV or JSONL. Filters take the same '
+        'names as the admin changelist filters, e.g. --filter status__exact=available.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout).')
+        parser.add_argument('--filter', action='append', default=[], metavar='NAME=VALUE')
+
+    def handle(self, *args, **options):
+        export = exports.EXPORTS[options['kind']]
+        params = {}
+        for item in options['filter']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'Filters look like NAME=VALUE, not {item!r}')
+            params[name] = value
+        try:
+            rows = export.rows(params)
+        except ValidationError as e:
+            raise CommandError('; '.join(f'{name}: {" ".join(errors)}' for name, errors in e.message_dict.items()))
+
+        lines = exports.encode(export, rows, options['format'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        try:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                out.writelines(lines)
+        except OSError as e:
+            raise CommandError(e)
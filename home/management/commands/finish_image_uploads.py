@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from home.images import process_image
+from home.models import HouseImage
+
+
+class Command(BaseCommand):
+    help = 'Upload listing photos left processing, e.g. by a worker restarted mid-upload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry uploads that failed.')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            HouseImage.objects.filter(status='failed').exclude(staged_file='').update(status='processing')
+        ids = list(HouseImage.objects.filter(status='processing').values_list('id', flat=True))
+        for image_id in ids:
+            process_image(image_id)
+        failed = HouseImage.objects.filter(id__in=ids, status='failed').count()
+        self.stdout.write(f'Processed {len(ids)} images, {failed} failed')
@@ -0,0 +1,59 @@
+import glob
+import os
+import shutil
+import tempfile
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from home.images import upload_variants
+from home.models import HouseImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Make resized variants for listing photos uploaded before variants existed. '
+        'Originals are read from MEDIA_ROOT (e.g. media/house_images), or downloaded with --download.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--download', action='store_true', help='Fetch originals not found locally from their URL.')
+        parser.add_argument('--limit', type=int, help='Stop after this many images.')
+
+    def handle(self, *args, **options):
+        images = HouseImage.objects.filter(status='ready', variants={}).order_by('id')
+        if options['limit']:
+            images = images[:options['limit']]
+        done = missing = failed = 0
+        with tempfile.TemporaryDirectory() as workdir:
+            for image in images.iterator(chunk_size=100):
+                path = self._fetch(image, workdir, options['download'])
+                if path is None:
+                    missing += 1
+                    continue
+                image.variants = upload_variants(path)
+                os.remove(path)
+                if not image.variants:
+                    failed += 1
+                    continue
+                image.save(update_fields=['variants'])
+                done += 1
+        self.stdout.write(f'{done} images resized, {missing} originals not found, {failed} failed')
+
+    def _fetch(self, image, workdir, download):
+        """Copy the original of ``image`` into ``workdir``; None if it cannot be found"""
+        public_id = image.image.public_id
+        names = [public_id, os.path.join('house_images', os.path.basename(public_id))]
+        for name in names:
+            for source in glob.glob(os.path.join(glob.escape(str(settings.MEDIA_ROOT)), glob.escape(name) + '.*')):
+                return shutil.copy(source, os.path.join(workdir, f'{image.pk}{os.path.splitext(source)[1]}'))
+        if download:
+            path = os.path.join(workdir, f'{image.pk}.{image.image.format or "jpg"}')
+            try:
+                urllib.request.urlretrieve(image.url, path)
+            except OSError as e:
+                self.stderr.write(f'Could not download image {image.pk}: {e}')
+                return None
+            return path
+        return None
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home import geo, search_cache
+from home.models import HouseListing
+
+
+class Command(BaseCommand):
+    help = (
+        'Place listings without coordinates at the centre of their area, using the offline '
+        'table in home.geo.AREA_CENTROIDS. Listings in unknown areas are left alone.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help='Also move listings that already have coordinates.')
+
+    def handle(self, *args, **options):
+        listings = HouseListing.objects.all()
+        if not options['overwrite']:
+            listings = listings.filter(latitude=None)
+        located = 0
+        with transaction.atomic():
+            for area, (lat, lng) in geo.AREA_CENTROIDS.items():
+                # One UPDATE per area; update() skips the signal that sets geo_row.
+                located += listings.filter(area__iexact=area).update(
+                    latitude=lat, longitude=lng, geo_row=geo.grid_row(lat),
+                )
+            transaction.on_commit(search_cache.invalidate)
+        missing = HouseListing.objects.filter(latitude=None).count()
+        self.stdout.write(self.style.SUCCESS(f'Located {located} listings; {missing} still have no coordinates'))
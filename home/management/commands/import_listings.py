@@ -0,0 +1,115 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from home import counters, geo, search_cache
+from home.forms import HouseListingForm
+from home.models import HouseListing
+
+
+class Command(BaseCommand):
+    help = (
+        'Import listings from a CSV (with a header row) or JSONL file, one listing per row, '
+        'using the same fields and validation as the create listing form. '
+        'Rows that fail validation are written to a rejects file and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, or "-" for stdin.')
+        parser.add_argument('--owner', required=True, help='Username of the owner of the imported listings.')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--rejects', help='Where to write rejected rows as JSONL (default: <path>.rejects.jsonl).')
+
+    def handle(self, *args, **options):
+        try:
+            self.owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named {options["owner"]}')
+
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        rejects_path = options['rejects'] or ('rejects.jsonl' if path == '-' else f'{path}.rejects.jsonl')
+
+        try:
+            with ExitStack() as files:
+                if path == '-':
+                    # Read stdin but leave it open; it is not ours to close.
+                    source = sys.stdin
+                else:
+                    source = files.enter_context(open(path, newline='', encoding='utf-8-sig'))
+                rejects = files.enter_context(open(rejects_path, 'w', encoding='utf-8'))
+                rows = self._read_csv(source) if fmt == 'csv' else self._read_jsonl(source)
+                imported, rejected = self._import(rows, rejects, options['batch_size'])
+        except OSError as e:
+            raise CommandError(e)
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} listings'))
+        if rejected:
+            self.stdout.write(self.style.WARNING(f'Rejected {rejected} rows; see {rejects_path}'))
+        else:
+            os.remove(rejects_path)
+
+    def _read_csv(self, source):
+        for line, row in enumerate(csv.DictReader(source), start=2):
+            yield line, row, None
+
+    def _read_jsonl(self, source):
+        for line, text in enumerate(source, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                yield line, text.rstrip('\n'), {'__all__': [f'Invalid JSON: {e}']}
+                continue
+            if not isinstance(row, dict):
+                yield line, row, {'__all__': ['Expected a JSON object']}
+                continue
+            yield line, row, None
+
+    def _import(self, rows, rejects, batch_size):
+        imported = rejected = 0
+        start = time.monotonic()
+        while batch := list(islice(rows, batch_size)):
+            listings = []
+            for line, row, errors in batch:
+                if errors is None:
+                    form = HouseListingForm(data=row)
+                    if form.is_valid():
+                        listing = form.save(commit=False)
+                        listing.owner = self.owner
+                        geo.locate(listing)
+                        listings.append(listing)
+                        continue
+                    errors = form.errors.get_json_data()
+                rejects.write(json.dumps({'line': line, 'row': row, 'errors': errors}) + '\n')
+                rejected += 1
+            self._save(listings)
+            imported += len(listings)
+            rate = (imported + rejected) / max(time.monotonic() - start, 1e-6)
+            self.stderr.write(f'\r{imported} imported, {rejected} rejected ({rate:.0f} rows/s)', ending='')
+        self.stderr.write('')
+        return imported, rejected
+
+    def _save(self, listings):
+        """Insert one batch and do what the per-row signals would have done"""
+        if not listings:
+            return
+        with transaction.atomic():
+            HouseListing.objects.bulk_create(listings)
+            days = Counter(timezone.localdate(listing.created_at) for listing in listings)
+            counters.add(counters.LISTINGS, len(listings))
+            for day, count in days.items():
+                counters.add(counters.listings_on(day), count)
+            transaction.on_commit(search_cache.invalidate)
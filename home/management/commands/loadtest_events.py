@@ -0,0 +1,138 @@
+import asyncio
+import resource
+import statistics
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Hold many idle /events/ connections open against a running ASGI server, e.g. '
+        '"SERVER=asgi ./entrypoint.sh" or "uvicorn find_home.asgi:application". '
+        'Raise "ulimit -n" for both processes first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--hold', type=float, default=40, help='Seconds to keep connections open.')
+        parser.add_argument('--ramp', type=int, default=200, help='New connections per second.')
+        parser.add_argument('--username', required=True, help='User to authenticate the streams as.')
+        parser.add_argument('--server-pid', type=int, help='Report this process\'s memory while connected.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named {options["username"]}')
+
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+        results = asyncio.run(self._run(options))
+        self._report(results, options)
+
+    async def _run(self, options):
+        self.open = 0
+        self.peak_rss = None
+        tasks = []
+        deadline = time.monotonic() + options['connections'] / options['ramp'] + options['hold']
+        for i in range(options['connections']):
+            tasks.append(asyncio.create_task(self._connect(options, deadline)))
+            if i % options['ramp'] == options['ramp'] - 1:
+                await asyncio.sleep(1)
+        monitor = asyncio.create_task(self._monitor(options, deadline))
+        results = await asyncio.gather(*tasks)
+        await monitor
+        return results
+
+    async def _connect(self, options, deadline):
+        """Open one stream; return (connect seconds, keep-alives seen) or an error string"""
+        start = time.monotonic()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(options['host'], options['port']), 30
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            return f'connect: {e.__class__.__name__}'
+        try:
+            writer.write((
+                'GET /events/ HTTP/1.1\r\n'
+                'Host: localhost\r\n'
+                'Accept: text/event-stream\r\n'
+                f'Cookie: {self.cookie}\r\n\r\n'
+            ).encode())
+            status = await asyncio.wait_for(reader.readline(), 30)
+            if b' 200 ' not in status:
+                return f'status: {status.decode().strip()}'
+            await asyncio.wait_for(reader.readuntil(b": connected"), 30)
+            connected = time.monotonic() - start
+            self.open += 1
+            keepalives = 0
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    return 'closed by server'
+                keepalives += line.startswith(b': keep-alive')
+            return connected, keepalives
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            return f'stream: {e.__class__.__name__}'
+        finally:
+            writer.close()
+
+    async def _monitor(self, options, deadline):
+        while time.monotonic() < deadline:
+            self.stdout.write(f'\r{self.open} streams open', ending='')
+            self.stdout.flush()
+            if options['server_pid']:
+                rss = self._rss_mb(options['server_pid'])
+                self.peak_rss = max(self.peak_rss or 0, rss or 0)
+            await asyncio.sleep(1)
+        self.stdout.write('')
+
+    def _rss_mb(self, pid):
+        try:
+            with open(f'/proc/{pid}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+
+    def _report(self, results, options):
+        streams = [r for r in results if isinstance(r, tuple)]
+        errors = {}
+        for r in results:
+            if isinstance(r, str):
+                errors[r] = errors.get(r, 0) + 1
+
+        self.stdout.write(f'Held {len(streams)}/{options["connections"]} streams for {options["hold"]:.0f}s')
+        if streams:
+            connect = sorted(s[0] * 1000 for s in streams)
+            self.stdout.write(
+                f'Connect ms: p50 {statistics.median(connect):.1f}, '
+                f'p95 {connect[int(len(connect) * 0.95) - 1]:.1f}, max {connect[-1]:.1f}'
+            )
+            alive = sum(1 for s in streams if s[1])
+            self.stdout.write(f'Streams that received a keep-alive: {alive}')
+        if self.peak_rss:
+            self.stdout.write(f'Server peak RSS: {self.peak_rss:.0f} MB')
+        for error, count in sorted(errors.items()):
+            self.stdout.write(self.style.ERROR(f'{count} x {error}'))
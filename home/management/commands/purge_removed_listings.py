@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from home.moderation import purge
+from home.models import HouseListing
+
+
+class Command(BaseCommand):
+    help = 'Delete listings removed by admins whose background deletion did not finish, e.g. after a restart.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Dependent rows deleted per transaction.')
+
+    def handle(self, *args, **options):
+        ids = list(HouseListing.objects.exclude(removed_at=None).values_list('id', flat=True))
+        deleted = purge(ids, batch_size=options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} removed listings')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from home import counters, moderation
+
+
+class Command(BaseCommand):
+    help = 'Recount the admin dashboard counters and per-listing report counts from the listing, profile and report tables.'
+
+    def handle(self, *args, **options):
+        values = counters.rebuild()
+        listings = moderation.rebuild_report_counts()
+        for name in (counters.LISTINGS, counters.USERS, counters.PENDING_REPORTS):
+            self.stdout.write(f'{name}: {values[name]}')
+        days = len(values) - 3
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(values)} counters ({days} daily listing counts) and the report counts of {listings} listings'
+        ))
@@ -0,0 +1,193 @@
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from home import counters, geo, moderation, search_cache
+from home.models import (
+    ChatMessage, Comment, HouseImage, HouseListing, Interest, Report, SavedListing, UserProfile,
+)
+
+AREAS = [
+    'Dhanmondi', 'Gulshan', 'Banani', 'Mirpur', 'Uttara', 'Mohammadpur',
+    'Bashundhara', 'Badda', 'Rampura', 'Motijheel', 'Farmgate', 'Shyamoli',
+]
+WORDS = [
+    'bright', 'spacious', 'quiet', 'furnished', 'family', 'flat', 'studio',
+    'duplex', 'apartment', 'room', 'sublet', 'lakeview', 'corner', 'modern',
+]
+LINES = [
+    'Is this still available?', 'Can I visit this weekend?', 'Is gas included in the rent?',
+    'How far is it from the main road?', 'Are pets allowed?', 'Is the advance negotiable?',
+    'Thanks, I will let you know.', 'Yes, it is available.', 'Please call me tomorrow.',
+]
+
+
+def skewed(rng, items, k, exponent=1.1):
+    """``k`` picks from ``items`` where the i-th item is ~1/i**exponent as likely as the first"""
+    weights = itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(len(items)))
+    return rng.choices(items, cum_weights=list(weights), k=k)
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic users, listings, images, comments, chat and reports '
+        'for performance work. Activity is skewed: a few owners hold most listings and a few '
+        'listings draw most comments, messages and reports. Every seeded user is named '
+        '<prefix>_..., and all of them share one password.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--owners', type=float, default=0.2, help='Fraction of users who are owners.')
+        parser.add_argument('--listings', type=int, default=10000)
+        parser.add_argument('--images', type=int, default=3, help='Most images per listing.')
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--messages', type=int, default=50000)
+        parser.add_argument('--reports', type=int, default=500)
+        parser.add_argument('--saved', type=int, default=10000, help='Saved listings and interests, each.')
+        parser.add_argument('--prefix', default='perf')
+        parser.add_argument('--password', default='perf')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--flush', action='store_true', help='Delete earlier seeded data first.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        seeded = User.objects.filter(username__startswith=f'{prefix}_')
+        if seeded.exists():
+            if not options['flush']:
+                raise CommandError(f'Users named {prefix}_... already exist; pass --flush to replace them')
+            self.stdout.write(f'Deleting {seeded.count()} earlier {prefix}_ users and everything they own')
+            seeded.delete()
+
+        with transaction.atomic():
+            owners, renters = self._users(prefix, options)
+            listings = self._listings(owners, options['listings'])
+            self._images(listings, options['images'])
+            # Popularity of listings for everything below, hottest first.
+            popular = self.rng.sample(listings, len(listings))
+            self._comments(popular, owners + renters, options['comments'])
+            self._chat(popular, renters, options['messages'])
+            self._reports(popular, renters, options['reports'])
+            self._saved(popular, renters, options['saved'])
+            counters.rebuild()
+            moderation.rebuild_report_counts()
+            transaction.on_commit(search_cache.invalidate)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(owners) + len(renters) + 1} users ({prefix}_admin, {prefix}_owner_0, '
+            f'{prefix}_renter_0, ...; password {options["password"]!r}) and {len(listings)} listings'
+        ))
+
+    def _create(self, model, rows):
+        created = []
+        for start in range(0, len(rows), self.batch_size):
+            created += model.objects.bulk_create(rows[start:start + self.batch_size])
+        self.stdout.write(f'  {len(created)} {model._meta.verbose_name_plural}')
+        return created
+
+    def _users(self, prefix, options):
+        password = make_password(options['password'])
+        owner_count = max(1, int(options['users'] * options['owners']))
+        names = [(f'{prefix}_admin', 'admin')]
+        names += [(f'{prefix}_owner_{i}', 'owner') for i in range(owner_count)]
+        names += [(f'{prefix}_renter_{i}', 'renter') for i in range(max(1, options['users'] - owner_count))]
+        users = self._create(User, [
+            User(username=name, email=f'{name}@example.com', password=password) for name, _ in names
+        ])
+        self._create(UserProfile, [
+            UserProfile(user=user, user_type=user_type) for user, (_, user_type) in zip(users, names)
+        ])
+        owners = [user for user, (_, user_type) in zip(users, names) if user_type == 'owner']
+        renters = [user for user, (_, user_type) in zip(users, names) if user_type == 'renter']
+        return owners, renters
+
+    def _listings(self, owners, count):
+        rng = self.rng
+        rows = []
+        # owner_0 is the busiest owner, which makes it the natural one to benchmark.
+        picks = zip(skewed(rng, owners, count), skewed(rng, AREAS, count))
+        for i, (owner, area) in enumerate(picks):
+            # Scattered a couple of km around the area's centre.
+            lat, lng = geo.AREA_CENTROIDS[area.lower()]
+            listing = HouseListing(
+                owner=owner,
+                title=' '.join(rng.sample(WORDS, 3)).title(),
+                description=' '.join(rng.choices(WORDS, k=rng.randint(20, 80))).capitalize() + '.',
+                house_type=rng.choice(HouseListing.HOUSE_TYPES)[0],
+                address=f'House {i}, Road {rng.randint(1, 40)}, Sector {rng.randint(1, 18)}, {area}',
+                area=area,
+                rent=int(rng.lognormvariate(9.6, 0.5)) // 500 * 500 + 500,
+                status='booked' if rng.random() < 0.25 else 'available',
+                contact_phone='01700000000',
+                contact_email=f'{owner.username}@example.com',
+                latitude=round(rng.gauss(lat, 0.012), 6),
+                longitude=round(rng.gauss(lng, 0.012), 6),
+            )
+            geo.locate(listing)
+            rows.append(listing)
+        return self._create(HouseListing, rows)
+
+    def _images(self, listings, most):
+        rows = [
+            HouseImage(listing=listing, image=f'house_images/{listing.owner.username}_{listing.pk}_{n}')
+            for listing in listings
+            for n in range(self.rng.randint(0, most))
+        ]
+        self._create(HouseImage, rows)
+        # bulk_create skips the signal that sets covers, so point them at each earliest image.
+        earliest = HouseImage.objects.filter(listing=OuterRef('pk'), status='ready').order_by('id').values('id')[:1]
+        owners = {listing.owner for listing in listings}
+        HouseListing.objects.filter(owner__in=owners).update(cover_image=Subquery(earliest))
+
+    def _comments(self, popular, authors, count):
+        rng = self.rng
+        threads = self._create(Comment, [
+            Comment(listing=listing, author=rng.choice(authors), content=rng.choice(LINES))
+            for listing in skewed(rng, popular, int(count * 0.7))
+        ])
+        self._create(Comment, [
+            Comment(listing_id=parent.listing_id, parent=parent, author=rng.choice(authors), content=rng.choice(LINES))
+            for parent in rng.choices(threads, k=count - len(threads))
+        ] if threads else [])
+
+    def _chat(self, popular, renters, count):
+        rng = self.rng
+        rows = []
+        # A conversation is a renter and a listing's owner; hot listings get more of them.
+        conversations = zip(skewed(rng, popular, count), skewed(rng, renters, count))
+        while len(rows) < count:
+            listing, renter = next(conversations)
+            for _ in range(min(count - len(rows), int(rng.paretovariate(1.2)) + 1)):
+                sender, receiver = (renter, listing.owner) if rng.random() < 0.55 else (listing.owner, renter)
+                rows.append(ChatMessage(
+                    listing=listing, sender=sender, receiver=receiver,
+                    message=rng.choice(LINES), is_read=rng.random() < 0.8,
+                ))
+        self._create(ChatMessage, rows)
+
+    def _reports(self, popular, renters, count):
+        rng = self.rng
+        self._create(Report, [
+            Report(listing=listing, reporter=rng.choice(renters), reason='Photos do not match the flat.',
+                   is_resolved=rng.random() < 0.6)
+            for listing in skewed(rng, popular, count, exponent=1.5)
+        ])
+
+    def _saved(self, popular, renters, count):
+        rng = self.rng
+        pairs = {(renter.pk, listing.pk) for renter, listing in zip(
+            skewed(rng, renters, count), skewed(rng, popular, count)
+        )}
+        self._create(SavedListing, [SavedListing(user_id=user, listing_id=listing) for user, listing in pairs])
+        self._create(Interest, [
+            Interest(renter_id=user, listing_id=listing, is_read=rng.random() < 0.5)
+            for user, listing in rng.sample(sorted(pairs), len(pairs) // 2)
+        ])
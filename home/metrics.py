@@ -0,0 +1,241 @@
+"""Per-view request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` times each request and, through a database execute
+wrapper, counts its SQL queries and their time. The ``DjangoTemplates``
+backend in settings adds template render time. Everything is labelled by
+URL name (never by raw path, which would grow without bound) and kept in
+plain in-process histograms, so the per-request cost is a few dictionary
+updates. Other modules add plain counters with ``increment``.
+
+Every ``HOME_METRICS_FLUSH_SECONDS`` each process writes its totals to its
+own file under ``HOME_METRICS_DIR``, and ``/metrics`` sums all the files
+there, so the scrape shows every gunicorn worker whichever one answers
+it. Files of exited workers are kept, so totals never go backwards while
+the directory lives; it is meant to be on local disk and emptied on
+deploy. Queries slower than ``HOME_METRICS_SLOW_QUERY_MS`` are logged.
+"""
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1_000, 5_000, 20_000, 50_000, 100_000, 250_000, 1_000_000)
+
+HISTOGRAMS = {
+    'findhome_request_duration_seconds': ('Request latency by URL name.', LATENCY_BUCKETS),
+    'findhome_request_db_queries': ('SQL queries run per request.', QUERY_BUCKETS),
+    'findhome_request_db_seconds': ('Time spent in SQL per request.', LATENCY_BUCKETS),
+    'findhome_request_template_seconds': ('Time spent rendering templates per request.', LATENCY_BUCKETS),
+    'findhome_response_size_bytes': ('Size of non-streaming response bodies.', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'findhome_throttle_requests_total': 'Rate-limited write requests by scope and outcome; see home/throttle.py.',
+}
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+_lock = threading.Lock()
+# (metric, labels) -> per-bucket counts (the last one is +Inf), then the sum;
+# for counters, just the total.
+_values = {}
+_last_flush = time.monotonic()
+_file_name = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+_current = contextvars.ContextVar('home_metrics_request', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'template_time', 'rendering')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+
+def observe(name, labels, value):
+    """Add ``value`` to histogram ``name``; ``labels`` is a tuple of (name, value) pairs"""
+    buckets = HISTOGRAMS[name][1]
+    with _lock:
+        row = _values.get((name, labels))
+        if row is None:
+            row = _values[(name, labels)] = [0] * (len(buckets) + 2)
+        row[bisect.bisect_left(buckets, value)] += 1
+        row[-1] += value
+
+
+def increment(name, labels, amount=1):
+    """Add ``amount`` to counter ``name``"""
+    with _lock:
+        row = _values.setdefault((name, labels), [0])
+        row[0] += amount
+
+
+def _row_length(name):
+    if name in COUNTERS:
+        return 1
+    if name in HISTOGRAMS:
+        return len(HISTOGRAMS[name][1]) + 2
+    return None
+
+
+def flush():
+    """Write this process's totals to its file in HOME_METRICS_DIR"""
+    global _last_flush
+    with _lock:
+        snapshot = [[name, list(labels), list(row)] for (name, labels), row in _values.items()]
+        _last_flush = time.monotonic()
+    directory = settings.HOME_METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, _file_name)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def collect():
+    """Totals of every process that has flushed, as {(metric, labels): row}"""
+    flush()
+    totals = {}
+    directory = settings.HOME_METRICS_DIR
+    for entry in os.scandir(directory):
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            # Replaced or removed while we read it.
+            continue
+        for name, labels, row in snapshot:
+            if len(row) != _row_length(name):
+                continue
+            key = (name, tuple(map(tuple, labels)))
+            total = totals.setdefault(key, [0] * len(row))
+            for i, value in enumerate(row):
+                total[i] += value
+    return totals
+
+
+def render():
+    """Every histogram and counter in the Prometheus text exposition format"""
+    totals = collect()
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, labels), row in sorted(totals.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), row):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {row[-1]}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (metric, labels), row in sorted(totals.items()):
+            if metric == name:
+                lines.append(f'{name}{_labels(labels)} {row[0]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class MetricsMiddleware:
+    """Records latency, SQL and template time and response size per URL name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        slow_ms = settings.HOME_METRICS_SLOW_QUERY_MS
+        self.slow_query_seconds = slow_ms / 1000 if slow_ms else None
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                timer = functools.partial(self.time_query, request, stats)
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def time_query(self, request, stats, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.queries += 1
+            stats.db_time += elapsed
+            if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+                logger.warning(
+                    'Slow query (%.0f ms) during %s %s: %s', elapsed * 1000, request.method, request.path, sql,
+                )
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        labels = (('view', view),)
+        status = str(response.status_code)
+        observe('findhome_request_duration_seconds', labels + (('method', method), ('status', status)), elapsed)
+        observe('findhome_request_db_queries', labels, stats.queries)
+        observe('findhome_request_db_seconds', labels, stats.db_time)
+        observe('findhome_request_template_seconds', labels, stats.template_time)
+        if not response.streaming:
+            observe('findhome_response_size_bytes', labels, len(response.content))
+        if time.monotonic() - _last_flush >= settings.HOME_METRICS_FLUSH_SECONDS:
+            try:
+                flush()
+            except OSError:
+                logger.exception('Could not write metrics to %s', settings.HOME_METRICS_DIR)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None or stats.rendering:
+            # Outside a request, or nested in a render that is already timed.
+            return super().render(context, request)
+        stats.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+            stats.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The stock Django template backend, with render time added to the request's metrics"""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
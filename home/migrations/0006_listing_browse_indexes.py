@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0005_listing_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='houselisting',
+            index=models.Index(condition=models.Q(('is_reported', False), ('status', 'available')), fields=['-created_at', '-id'], name='listing_browse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houselisting',
+            index=models.Index(condition=models.Q(('is_reported', False), ('status', 'available')), fields=['house_type', '-created_at', '-id'], name='listing_type_browse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houselisting',
+            index=models.Index(condition=models.Q(('is_reported', False), ('status', 'available')), fields=['rent'], name='listing_rent_browse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houselisting',
+            index=models.Index(condition=models.Q(('is_reported', False), ('status', 'available')), fields=['house_type', 'rent'], name='listing_type_rent_browse_idx'),
+        ),
+    ]
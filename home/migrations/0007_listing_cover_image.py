@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_cover_images(apps, schema_editor):
+    HouseListing = apps.get_model('home', 'HouseListing')
+    HouseImage = apps.get_model('home', 'HouseImage')
+    first_image = HouseImage.objects.filter(listing=OuterRef('pk')).order_by('id').values('id')[:1]
+    HouseListing.objects.update(cover_image=Subquery(first_image))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0006_listing_browse_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='houselisting',
+            name='cover_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='home.houseimage'),
+        ),
+        migrations.RunPython(backfill_cover_images, migrations.RunPython.noop),
+    ]
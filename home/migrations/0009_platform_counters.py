@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_existing_rows(apps, schema_editor):
+    from home.counters import rebuild
+
+    rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_comment_thread_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('is_resolved', False)), fields=['-created_at', '-id'], name='report_pending_idx'),
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
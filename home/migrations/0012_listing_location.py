@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0011_house_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='houselisting',
+            name='geo_row',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='houselisting',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='houselisting',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='houselisting',
+            index=models.Index(condition=models.Q(('is_reported', False), ('status', 'available')), fields=['geo_row', 'longitude', 'latitude'], name='listing_geo_browse_idx'),
+        ),
+    ]
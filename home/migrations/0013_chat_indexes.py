@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0012_listing_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['receiver', 'is_read', 'listing', 'sender'], name='chat_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['listing', 'sender', 'receiver', 'timestamp'], name='chat_conversation_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+from home.search import install_search_index
+
+
+def repair_search_index(apps, schema_editor):
+    # Adding a NOT NULL column rebuilds the table on SQLite, dropping the search triggers.
+    install_search_index(schema_editor.connection)
+
+
+def count_pending_reports(apps, schema_editor):
+    from home.moderation import rebuild_report_counts
+
+    rebuild_report_counts(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_chat_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, repair_search_index),
+        migrations.AddField(
+            model_name='houselisting',
+            name='pending_report_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='houselisting',
+            name='removed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='houselisting',
+            index=models.Index(condition=models.Q(('pending_report_count__gt', 0), ('removed_at', None)), fields=['-pending_report_count', '-id'], name='listing_reported_idx'),
+        ),
+        migrations.RunPython(count_pending_reports, migrations.RunPython.noop),
+        migrations.RunPython(repair_search_index, migrations.RunPython.noop),
+    ]
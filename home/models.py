@@ -43,20 +43,97 @@ class HouseListing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_reported = models.BooleanField(default=False)
+    # Unresolved reports, kept by the Report signals in home.signals (see home.moderation).
+    pending_report_count = models.PositiveIntegerField(default=0, editable=False)
+    # Set when an admin removes the listing; it is deleted in the background.
+    removed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Latitude band for the location index; set from latitude by home.signals.
+    geo_row = models.IntegerField(null=True, blank=True, editable=False)
+    # Denormalized first image so listing grids can select_related() it;
+    # kept current by the HouseImage signals in home.signals.
+    cover_image = models.ForeignKey(
+        'HouseImage', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
+    
+    class Meta:
+        # Partial indexes for the public browse path (home.search.filter_listings):
+        # available, unreported listings, optionally by type and rent, newest first.
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'], name='listing_browse_idx',
+                condition=models.Q(status='available', is_reported=False),
+            ),
+            models.Index(
+                fields=['house_type', '-created_at', '-id'], name='listing_type_browse_idx',
+                condition=models.Q(status='available', is_reported=False),
+            ),
+            models.Index(
+                fields=['rent'], name='listing_rent_browse_idx',
+                condition=models.Q(status='available', is_reported=False),
+            ),
+            models.Index(
+                fields=['house_type', 'rent'], name='listing_type_rent_browse_idx',
+                condition=models.Q(status='available', is_reported=False),
+            ),
+            # Reported listings for the admin dashboard, most reported first.
+            models.Index(
+                fields=['-pending_report_count', '-id'], name='listing_reported_idx',
+                condition=models.Q(pending_report_count__gt=0, removed_at=None),
+            ),
+            # Radius and map searches (home.geo): a longitude range per latitude band,
+            # with latitude included so the distance test runs on the index alone.
+            models.Index(
+                fields=['geo_row', 'longitude', 'latitude'], name='listing_geo_browse_idx',
+                condition=models.Q(status='available', is_reported=False),
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
     def get_absolute_url(self):
         return reverse('listing_detail', kwargs={'pk': self.pk})
+    
+    def refresh_cover_image(self):
+        """Point cover_image at the listing's earliest remaining ready image"""
+        self.cover_image = self.images.filter(status='ready').order_by('id').first()
+        HouseListing.objects.filter(pk=self.pk).update(cover_image=self.cover_image)
 
 class HouseImage(models.Model):
+    STATUS_CHOICES = (
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+    
     listing = models.ForeignKey(HouseListing, on_delete=models.CASCADE, related_name='images')
-    image = CloudinaryField('image')
+    # Empty until home.images has pushed the staged upload to storage.
+    image = CloudinaryField('image', blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ready')
+    staged_file = models.CharField(max_length=255, blank=True, editable=False)
+    # Stored names of the resized copies, keyed by width (see home.images.VARIANT_WIDTHS).
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Image for {self.listing.title}"
+    
+    @property
+    def url(self):
+        """Public URL of the stored image, from the configured image storage"""
+        from .images import get_image_storage
+        return get_image_storage().url(self.image)
+    
+    @property
+    def variant_urls(self):
+        """URLs of the resized copies by width, smallest first"""
+        from .images import get_image_storage
+        storage = get_image_storage()
+        field = self._meta.get_field('image')
+        widths = sorted(self.variants, key=int)
+        return {int(width): storage.url(field.to_python(self.variants[width])) for width in widths}
 
 class SavedListing(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -85,6 +162,14 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Top-level threads for the listing detail page, newest first.
+            models.Index(
+                fields=['listing', '-created_at', '-id'],
+                condition=models.Q(parent__isnull=True),
+                name='comment_thread_idx',
+            ),
+        ]
 
 class ChatMessage(models.Model):
     listing = models.ForeignKey(HouseListing, on_delete=models.CASCADE)
@@ -96,6 +181,12 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Unread counts; listing and sender let the inbox read received messages from the index alone.
+            models.Index(fields=['receiver', 'is_read', 'listing', 'sender'], name='chat_unread_idx'),
+            # One conversation's history, in order.
+            models.Index(fields=['listing', 'sender', 'receiver', 'timestamp'], name='chat_conversation_idx'),
+        ]
 
 class Report(models.Model):
     listing = models.ForeignKey(HouseListing, on_delete=models.CASCADE)
@@ -103,3 +194,20 @@ class Report(models.Model):
     reason = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_resolved = models.BooleanField(default=False)
+    
+    class Meta:
+        indexes = [
+            # The admin dashboard's pending report queue, newest first.
+            models.Index(
+                fields=['-created_at', '-id'], name='report_pending_idx',
+                condition=models.Q(is_resolved=False),
+            ),
+        ]
+
+class PlatformCounter(models.Model):
+    """A running total for the admin dashboard, kept current by home.counters"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f'{self.name} = {self.value}'
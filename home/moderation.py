@@ -0,0 +1,161 @@
+"""Report handling: per-listing report counts, automatic hiding and bulk moderation.
+
+Every listing keeps ``pending_report_count``, maintained by the Report
+signals in home.signals. Once it reaches ``HOME_REPORT_HIDE_THRESHOLD``
+the listing is hidden from search (``is_reported``) until an admin
+dismisses or removes it. The admin dashboard lists reported listings by
+that count, so a spam wave shows up as a few rows rather than hundreds.
+
+Bulk actions are a handful of set-based UPDATEs whatever the number of
+reports. Removing hides the listings at once and deletes them after the
+request, on a background thread, in batches: first their chat, comments,
+interests and saved rows, ``PURGE_BATCH_SIZE`` rows per transaction, then
+the listings themselves with their images and reports. Listings left
+behind by a worker that died mid-purge are finished by
+``manage.py purge_removed_listings``.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from . import autocomplete, counters, search_cache
+from .models import ChatMessage, Comment, HouseListing, Interest, Report, SavedListing
+from .pagination import CursorPaginator
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 1000
+# Listings are deleted a few at a time; each brings its images and reports along.
+LISTING_BATCH_SIZE = 50
+# Rows that hang off a listing, deleted in batches before it.
+DEPENDENT_MODELS = (ChatMessage, Comment, Interest, SavedListing)
+
+_executor = None
+
+
+def _listings_changed():
+    transaction.on_commit(search_cache.invalidate)
+    transaction.on_commit(autocomplete.reset)
+
+
+def count_reports(listing_id, delta):
+    """Adjust a listing's pending report count, hiding it once it reaches the threshold"""
+    if not delta:
+        return
+    HouseListing.objects.filter(pk=listing_id).update(pending_report_count=F('pending_report_count') + delta)
+    threshold = settings.HOME_REPORT_HIDE_THRESHOLD
+    if delta > 0 and threshold:
+        hidden = HouseListing.objects.filter(
+            pk=listing_id, is_reported=False, pending_report_count__gte=threshold,
+        ).update(is_reported=True)
+        if hidden:
+            _listings_changed()
+
+
+def _resolve_reports(listing_ids):
+    resolved = Report.objects.filter(listing_id__in=listing_ids, is_resolved=False).update(is_resolved=True)
+    counters.add(counters.PENDING_REPORTS, -resolved)
+    return resolved
+
+
+@transaction.atomic
+def dismiss(listing_ids):
+    """Resolve every pending report on the listings and show them again; returns the reports resolved
+
+    Listings already removed stay hidden until their purge deletes them.
+    """
+    listings = HouseListing.objects.filter(pk__in=listing_ids, removed_at=None)
+    listing_ids = list(listings.select_for_update().values_list('pk', flat=True))
+    resolved = _resolve_reports(listing_ids)
+    HouseListing.objects.filter(pk__in=listing_ids).update(pending_report_count=0, is_reported=False)
+    _listings_changed()
+    return resolved
+
+
+@transaction.atomic
+def remove(listing_ids):
+    """Hide the listings now and delete them in the background; returns the listings removed"""
+    _resolve_reports(listing_ids)
+    removed = HouseListing.objects.filter(pk__in=listing_ids, removed_at=None).update(
+        pending_report_count=0, is_reported=True, removed_at=timezone.now(),
+    )
+    _listings_changed()
+    ids = list(listing_ids)
+    transaction.on_commit(lambda: submit(ids))
+    return removed
+
+
+def submit(listing_ids):
+    """Purge removed listings on the background thread, or inline without one"""
+    global _executor
+    if not settings.HOME_PURGE_IN_BACKGROUND:
+        purge(listing_ids)
+        return
+    if _executor is None:
+        # One thread, so purges never compete with each other for locks.
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='listing-purge')
+    _executor.submit(_purge_in_thread, listing_ids)
+
+
+def _purge_in_thread(listing_ids):
+    try:
+        purge(listing_ids)
+    except Exception:
+        logger.exception('Purging removed listings %s failed', listing_ids)
+    finally:
+        connection.close()
+
+
+def purge(listing_ids, batch_size=PURGE_BATCH_SIZE):
+    """Delete removed listings and everything hanging off them in short transactions; returns the listings deleted"""
+    ids = list(HouseListing.objects.filter(pk__in=listing_ids).exclude(removed_at=None).values_list('pk', flat=True))
+    for model in DEPENDENT_MODELS:
+        while True:
+            with transaction.atomic():
+                batch = list(model.objects.filter(listing_id__in=ids).values_list('pk', flat=True)[:batch_size])
+                if not batch:
+                    break
+                model.objects.filter(pk__in=batch).delete()
+    deleted = 0
+    for start in range(0, len(ids), LISTING_BATCH_SIZE):
+        with transaction.atomic():
+            listings = HouseListing.objects.filter(pk__in=ids[start:start + LISTING_BATCH_SIZE])
+            deleted += listings.delete()[1].get(HouseListing._meta.label, 0)
+    return deleted
+
+
+def reported_listings(cursor, per_page=10, reasons=3):
+    """A page of listings with pending reports, most reported first, each with its latest ``reasons``"""
+    listings = (
+        HouseListing.objects.filter(pending_report_count__gt=0, removed_at=None)
+        .select_related('owner').order_by('-pending_report_count', '-id')
+    )
+    page = CursorPaginator(listings, per_page).get_page(cursor)
+    latest = (
+        Report.objects.filter(listing__in=[listing.pk for listing in page], is_resolved=False)
+        .annotate(position=Window(RowNumber(), partition_by=F('listing_id'), order_by=F('id').desc()))
+        .filter(position__lte=reasons).select_related('reporter').order_by('-id')
+    )
+    by_listing = {listing.pk: [] for listing in page}
+    for report in latest:
+        by_listing[report.listing_id].append(report)
+    for listing in page:
+        listing.latest_reports = by_listing[listing.pk]
+    return page
+
+
+def rebuild_report_counts(apps=global_apps):
+    """Recount every listing's pending reports from the report table"""
+    HouseListing = apps.get_model('home', 'HouseListing')
+    Report = apps.get_model('home', 'Report')
+    pending = (
+        Report.objects.filter(listing=OuterRef('pk'), is_resolved=False)
+        .order_by().values('listing').annotate(count=Count('id')).values('count')
+    )
+    return HouseListing.objects.update(pending_report_count=Coalesce(Subquery(pending), Value(0)))
@@ -0,0 +1,154 @@
+"""Cursor pagination that never runs COUNT(*) or OFFSET.
+
+A page is read with a range condition on the queryset's ordering columns,
+so with a matching index page 500 costs the same as page 1. Cursors are
+signed, opaque tokens; a missing or tampered cursor gives the first page.
+"""
+from collections.abc import Sequence
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SALT = 'home.pagination'
+
+
+class CursorPaginator:
+    """Paginate an ordered queryset by its ordering columns.
+
+    Every ordering term must be a concrete field or an annotation (aggregates
+    are compared in HAVING), and all must share one direction, e.g.
+    ``('-created_at', '-id')``. Querysets ordered by anything else (such as
+    a raw SQL search rank) fall back to offset cursors. Pages never count
+    the matches; ``has_next`` says whether there are more.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(queryset.query.order_by)
+        self.fields = self._key_fields()
+
+    def _key_fields(self):
+        opts = self.queryset.model._meta
+        annotations = self.queryset.query.annotations
+        if not all(isinstance(term, str) for term in self.ordering):
+            return None
+        names = ['id' if term.lstrip('-') == 'pk' else term.lstrip('-') for term in self.ordering]
+        descending = {term.startswith('-') for term in self.ordering}
+        if not names or len(descending) != 1:
+            return None
+        fields = []
+        for name in names:
+            if name in annotations:
+                # Raw SQL can come back rounded (ts_rank is a float4), so the
+                # cursor would not compare equal to the row it came from.
+                if isinstance(annotations[name], RawSQL):
+                    return None
+                field = annotations[name].output_field
+            else:
+                try:
+                    field = opts.get_field(name)
+                except FieldDoesNotExist:
+                    return None
+                if not field.concrete:
+                    return None
+            if field.is_relation:
+                return None
+            fields.append(field)
+        self.names = names
+        self.descending = descending.pop()
+        return fields
+
+    def get_page(self, cursor):
+        position = self._decode(cursor)
+        if self.fields is None:
+            return self._offset_page(position.get('o', 0))
+        if 'k' not in position:
+            return self._keyset_page(self.queryset, has_previous=False)
+        values = [field.to_python(value) for field, value in zip(self.fields, position['k'])]
+        if position.get('d') == 'p':
+            queryset = self.queryset.filter(self._beyond(values, reverse=True)).reverse()
+            return self._keyset_page(queryset, has_next=True, reverse=True)
+        return self._keyset_page(self.queryset.filter(self._beyond(values)), has_previous=True)
+
+    def _beyond(self, values, reverse=False):
+        """Rows strictly after ``values`` in this ordering (before, if ``reverse``)"""
+        descending = self.descending != reverse
+        op = 'lt' if descending else 'gt'
+        names = self.names
+        condition = Q(**{f'{names[-1]}__{op}': values[-1]})
+        for name, value in zip(reversed(names[:-1]), reversed(values[:-1])):
+            condition = Q(**{f'{name}__{op}': value}) | (Q(**{name: value}) & condition)
+        if len(names) == 1:
+            return condition
+        # The redundant bound on the leading column lets the index seek to the page.
+        bound = Q(**{f'{names[0]}__{op}e': values[0]})
+        return bound & condition
+
+    def _keyset_page(self, queryset, has_previous=None, has_next=None, reverse=False):
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_previous = more
+        else:
+            has_next = more
+        next_cursor = self._encode({'d': 'n', 'k': self._key(rows[-1])}) if has_next and rows else None
+        previous_cursor = self._encode({'d': 'p', 'k': self._key(rows[0])}) if has_previous and rows else None
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _offset_page(self, offset):
+        offset = max(int(offset), 0)
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        next_cursor = previous_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self._encode({'o': offset + self.per_page})
+        if offset:
+            previous_cursor = self._encode({'o': max(offset - self.per_page, 0)})
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _key(self, row):
+        values = [row[name] if isinstance(row, dict) else getattr(row, name) for name in self.names]
+        return [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values]
+
+    def _encode(self, position):
+        return signing.dumps(position, salt=SALT, compress=True)
+
+    def _decode(self, cursor):
+        if not cursor:
+            return {}
+        try:
+            position = signing.loads(cursor, salt=SALT)
+        except signing.BadSignature:
+            return {}
+        return position if isinstance(position, dict) else {}
+
+
+class CursorPage(Sequence):
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
@@ -0,0 +1,88 @@
+"""The logged-in user and their UserProfile, resolved once per request.
+
+``ProfileBackend`` is ModelBackend with a cheaper ``get_user``: it loads
+the session's user joined with its UserProfile and keeps the pair in the
+``PROFILE_CACHE`` cache, so ``request.user`` (which Django resolves lazily,
+once per request) usually costs no query and ``request.user.userprofile``
+never does. Signals in home.signals drop the entry when the user or the
+profile is saved or deleted. Other workers keep their copy until the
+cache TIMEOUT, so with the default per-process cache a change such as
+deactivating a user takes up to a minute to reach every worker; point
+PROFILE_CACHE_BACKEND at a shared cache for immediate effect. Cached
+users include their password hash, which Django needs to check sessions.
+
+Views use ``get_profile`` and ``role_of`` instead of querying UserProfile,
+and ``role_required`` for the usual "wrong kind of user" redirect.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.http import Http404
+from django.shortcuts import redirect
+
+from .models import UserProfile
+
+
+def get_cache():
+    return caches[settings.PROFILE_CACHE]
+
+
+def cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def forget(user_id):
+    """Drop ``user_id``'s cached user and profile"""
+    get_cache().delete(cache_key(user_id))
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend whose users come with their profile, from the profile cache when possible"""
+
+    def get_user(self, user_id):
+        cache = get_cache()
+        key = cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = User._default_manager.select_related('userprofile').filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(key, user)
+        return user if self.user_can_authenticate(user) else None
+
+
+def get_profile(user):
+    """``user``'s UserProfile; Http404 if they have none"""
+    try:
+        return user.userprofile
+    except UserProfile.DoesNotExist:
+        raise Http404('No UserProfile matches the given query.')
+
+
+def role_of(user):
+    """``user``'s user_type, or None for anonymous users and users without a profile"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.userprofile.user_type
+    except UserProfile.DoesNotExist:
+        return None
+
+
+def role_required(*roles, message='Unauthorized access.'):
+    """Only let in logged-in users whose profile has one of ``roles``; others go home with ``message``"""
+    def decorator(view):
+        @wraps(view)
+        @login_required
+        def wrapper(request, *args, **kwargs):
+            if get_profile(request.user).user_type not in roles:
+                messages.error(request, message)
+                return redirect('home')
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,191 @@
+"""Full-text search over HouseListing title, area and address.
+
+SQLite uses an FTS5 external-content table kept in sync by triggers, so
+bulk inserts and queryset updates are indexed too. PostgreSQL uses a GIN
+expression index over a ``tsvector`` that the database maintains itself.
+Any other backend falls back to the original ``icontains`` scan.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from . import geo
+from .models import HouseListing
+
+FTS_TABLE = 'home_houselisting_fts'
+PG_INDEX = 'home_houselisting_search_gin'
+MAX_TERMS = 8
+
+# The GIN index is only used when the query repeats this exact expression.
+PG_VECTOR = (
+    "to_tsvector('simple', coalesce(home_houselisting.title, '') || ' ' || "
+    "coalesce(home_houselisting.area, '') || ' ' || "
+    "coalesce(home_houselisting.address, ''))"
+)
+
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, area, address,
+        content='home_houselisting', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON home_houselisting BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, area, address)
+        VALUES (new.id, new.title, new.area, new.address);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON home_houselisting BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, area, address)
+        VALUES ('delete', old.id, old.title, old.area, old.address);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, area, address ON home_houselisting BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, area, address)
+        VALUES ('delete', old.id, old.title, old.area, old.address);
+        INSERT INTO {FTS_TABLE}(rowid, title, area, address)
+        VALUES (new.id, new.title, new.area, new.address);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+PG_INSTALL = [
+    f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON home_houselisting USING GIN ({PG_VECTOR})",
+]
+
+PG_UNINSTALL = [
+    f"DROP INDEX IF EXISTS {PG_INDEX}",
+]
+
+_fts_tables = {}
+
+
+def install_search_index(connection):
+    """Create (or repair) the search index for ``connection``'s backend.
+
+    Safe to run repeatedly. SQLite migrations that rebuild
+    ``home_houselisting`` drop its triggers, so run this again after them.
+    """
+    if connection.vendor == 'sqlite':
+        statements = SQLITE_INSTALL
+    elif connection.vendor == 'postgresql':
+        statements = PG_INSTALL
+    else:
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    _fts_tables.pop(connection.alias, None)
+
+
+def uninstall_search_index(connection):
+    """Drop the search index for ``connection``'s backend"""
+    if connection.vendor == 'sqlite':
+        statements = SQLITE_UNINSTALL
+    elif connection.vendor == 'postgresql':
+        statements = PG_UNINSTALL
+    else:
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    _fts_tables.pop(connection.alias, None)
+
+
+def has_fts_table(alias):
+    """Whether the SQLite FTS5 table exists on database ``alias``"""
+    if alias not in _fts_tables:
+        connection = connections[alias]
+        _fts_tables[alias] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[alias]
+
+
+def search_terms(query):
+    """Split free text into lower-cased word tokens safe for either backend"""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def icontains_search(queryset, query):
+    """The original unindexed substring search"""
+    return queryset.filter(
+        Q(area__icontains=query) |
+        Q(address__icontains=query) |
+        Q(title__icontains=query)
+    )
+
+
+def filter_listings(data):
+    """Available listings matching cleaned ``SearchForm`` data, newest first"""
+    listings = HouseListing.objects.filter(status='available', is_reported=False)
+    listings = listings.order_by('-created_at', '-id')
+
+    query = data.get('query')
+    house_type = data.get('house_type')
+    min_rent = data.get('min_rent')
+    max_rent = data.get('max_rent')
+
+    if query:
+        listings = search_listings(listings, query)
+
+    if house_type:
+        listings = listings.filter(house_type=house_type)
+
+    if min_rent:
+        listings = listings.filter(rent__gte=min_rent)
+
+    if max_rent:
+        listings = listings.filter(rent__lte=max_rent)
+
+    bbox = data.get('bbox')
+    if bbox:
+        west, south, east, north = bbox
+        listings = geo.within_bbox(listings, south, west, north, east)
+
+    lat, lng = data.get('lat'), data.get('lng')
+    if lat is not None and lng is not None:
+        radius_km = data.get('radius_km') or geo.DEFAULT_RADIUS_KM
+        listings = geo.within_radius(listings, lat, lng, radius_km)
+        if data.get('sort') == 'distance':
+            listings = listings.order_by('distance_sq', 'id')
+
+    return listings
+
+
+def search_listings(queryset, query):
+    """Filter ``queryset`` to listings matching ``query``, best match first.
+
+    Every word must match the start of a word in the title, area or
+    address, so partially typed words still find results. Matches are
+    annotated with ``search_rank`` (higher is better).
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        matches = RawSQL(f"{PG_VECTOR} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+        rank = RawSQL(f"ts_rank({PG_VECTOR}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+        queryset = queryset.filter(matches).annotate(search_rank=rank)
+    elif vendor == 'sqlite' and has_fts_table(queryset.db):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # bm25() only works in the query that joins the FTS table, and the ORM
+        # cannot join an unrelated table; ranking in a correlated subquery
+        # instead runs the MATCH once per row, over 20 times slower.
+        queryset = queryset.extra(
+            select={'search_rank': f'-bm25({FTS_TABLE})'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = home_houselisting.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        )
+    else:
+        return icontains_search(queryset, query)
+
+    return queryset.order_by('-search_rank', '-created_at', '-id')
@@ -0,0 +1,125 @@
+"""Cache of listing search result pages.
+
+An entry holds the listing ids of one page of ``filter_listings`` results
+plus the page's cursors, keyed on the normalized search form data and the
+page position. Keys embed a generation number, and any
+listing change that could move a listing into or out of some result set
+bumps the generation, so stale pages are never read again and simply age
+out of the cache.
+
+Facet counts for the search form (home.facets) are cached the same way.
+
+The backend is the ``SEARCH_CACHE`` alias in ``CACHES``; the default
+LocMemCache gives a per-process LRU with a TTL.
+"""
+import hashlib
+import json
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .facets import facet_counts
+from .models import HouseListing
+from .pagination import CursorPage, CursorPaginator
+from .search import filter_listings
+
+GENERATION_KEY = 'generation'
+STATS_KEYS = {'hits': 'stats:hits', 'misses': 'stats:misses'}
+
+# Changes to these fields can change which listings a search returns.
+SEARCH_FIELDS = (
+    'status', 'is_reported', 'rent', 'house_type', 'title', 'area', 'address', 'latitude', 'longitude',
+)
+
+
+def get_cache():
+    return caches[settings.SEARCH_CACHE]
+
+
+def _generation(cache):
+    # Seeding from the clock means an evicted counter never comes back lower.
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, timeout=None)
+
+
+def invalidate():
+    """Retire every cached page"""
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def _count(cache, stat):
+    key = STATS_KEYS[stat]
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def stats():
+    """Hit/miss counters since the cache backend last lost them"""
+    values = get_cache().get_many(STATS_KEYS.values())
+    hits, misses = values.get(STATS_KEYS['hits'], 0), values.get(STATS_KEYS['misses'], 0)
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / lookups if lookups else None}
+
+
+def normalize(data):
+    """Search form data reduced to what affects the results"""
+    key = {}
+    query = ' '.join((data.get('query') or '').lower().split())
+    if query:
+        key['query'] = query
+    if data.get('house_type'):
+        key['house_type'] = data['house_type']
+    for name in ('min_rent', 'max_rent'):
+        value = data.get(name)
+        if value:
+            key[name] = format(Decimal(value).normalize(), 'f')
+    for name in ('lat', 'lng', 'radius_km', 'bbox', 'sort'):
+        if data.get(name) not in (None, ''):
+            key[name] = data[name]
+    return key
+
+
+def cached_listing_page(data, cursor, per_page):
+    """One ``CursorPage`` of ``filter_listings(data)``, served from the cache when possible"""
+    paginator = CursorPaginator(filter_listings(data).select_related('cover_image'), per_page)
+    cache = get_cache()
+    # Cursors are timestamped, so key on the decoded position rather than the token.
+    position = json.dumps([normalize(data), paginator._decode(cursor), per_page], sort_keys=True)
+    key = f'page:{_generation(cache)}:{hashlib.md5(position.encode()).hexdigest()}'
+
+    entry = cache.get(key)
+    if entry is not None:
+        listings = HouseListing.objects.select_related('cover_image').in_bulk(entry['ids'])
+        rows = [listings[pk] for pk in entry['ids'] if pk in listings]
+        if len(rows) == len(entry['ids']):
+            _count(cache, 'hits')
+            return CursorPage(rows, paginator, entry['next'], entry['previous'])
+
+    _count(cache, 'misses')
+    page = paginator.get_page(cursor)
+    cache.set(key, {
+        'ids': [listing.pk for listing in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+    return page
+
+
+def cached_facets(data):
+    """``facet_counts(data)``, cached and invalidated like result pages"""
+    cache = get_cache()
+    position = json.dumps(normalize(data), sort_keys=True)
+    key = f'facets:{_generation(cache)}:{hashlib.md5(position.encode()).hexdigest()}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = facet_counts(data)
+        cache.set(key, counts)
+    return counts
@@ -0,0 +1,174 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, counters, geo, images, moderation, profiles, search_cache
+from .models import HouseImage, HouseListing, Report, UserProfile
+
+
+@receiver(post_save, sender=HouseImage)
+def set_cover_image(sender, instance, **kwargs):
+    """Use the first image uploaded for a listing as its cover once it is ready"""
+    if instance.status == 'ready':
+        # Uploads finish in any order; an earlier image still takes over the cover.
+        HouseListing.objects.filter(
+            Q(cover_image=None) | Q(cover_image__gt=instance.pk), pk=instance.listing_id,
+        ).update(cover_image=instance)
+
+
+@receiver(post_delete, sender=HouseImage)
+def replace_cover_image(sender, instance, **kwargs):
+    """Fall back to the next image when the cover is deleted"""
+    listing = HouseListing.objects.filter(pk=instance.listing_id, cover_image=None).first()
+    if listing is not None:
+        listing.refresh_cover_image()
+
+
+@receiver(post_delete, sender=HouseImage)
+def discard_staged_file(sender, instance, **kwargs):
+    if instance.staged_file:
+        transaction.on_commit(lambda: images.staging_storage().delete(instance.staged_file))
+
+
+@receiver(pre_save, sender=HouseListing)
+def set_geo_row(sender, instance, **kwargs):
+    geo.locate(instance)
+
+
+def _search_state(instance):
+    # Read __dict__ directly so deferred fields are not fetched.
+    return tuple(instance.__dict__.get(field) for field in search_cache.SEARCH_FIELDS)
+
+
+@receiver(post_init, sender=HouseListing)
+def remember_search_state(sender, instance, **kwargs):
+    instance._search_state = _search_state(instance)
+
+
+@receiver(post_save, sender=HouseListing)
+def invalidate_search_on_save(sender, instance, created, **kwargs):
+    """Drop cached search pages when a listing could enter or leave results"""
+    state = _search_state(instance)
+    if created or state != instance._search_state:
+        transaction.on_commit(search_cache.invalidate)
+    instance._search_state = state
+
+
+@receiver(post_delete, sender=HouseListing)
+def invalidate_search_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(search_cache.invalidate)
+
+
+_UNKNOWN = object()
+
+
+def _searchable_area(instance):
+    """The area autocomplete counts ``instance`` under, None if it is not searchable"""
+    fields = instance.__dict__
+    if not {'area', 'status', 'is_reported'} <= fields.keys():
+        # Loaded with some of them deferred.
+        return _UNKNOWN
+    if fields['status'] != 'available' or fields['is_reported']:
+        return None
+    return fields['area']
+
+
+@receiver(post_init, sender=HouseListing)
+def remember_searchable_area(sender, instance, **kwargs):
+    instance._searchable_area = _searchable_area(instance)
+
+
+@receiver(post_save, sender=HouseListing)
+def update_autocomplete_on_save(sender, instance, created, **kwargs):
+    before = None if created else instance._searchable_area
+    after = instance._searchable_area = _searchable_area(instance)
+    if before is _UNKNOWN or after is _UNKNOWN:
+        transaction.on_commit(autocomplete.reset)
+    elif before != after:
+        transaction.on_commit(lambda: autocomplete.moved(before, after))
+
+
+@receiver(post_delete, sender=HouseListing)
+def update_autocomplete_on_delete(sender, instance, **kwargs):
+    before = instance._searchable_area
+    if before is _UNKNOWN:
+        transaction.on_commit(autocomplete.reset)
+    elif before is not None:
+        transaction.on_commit(lambda: autocomplete.moved(before, None))
+
+
+@receiver(post_save, sender=HouseListing)
+def count_new_listing(sender, instance, created, **kwargs):
+    if created:
+        counters.add(counters.LISTINGS, 1)
+        counters.add(counters.listings_on(timezone.localdate(instance.created_at)), 1)
+
+
+@receiver(post_delete, sender=HouseListing)
+def uncount_listing(sender, instance, **kwargs):
+    counters.add(counters.LISTINGS, -1)
+    counters.add(counters.listings_on(timezone.localdate(instance.created_at)), -1)
+
+
+def _forget_user(user_id):
+    # Again after commit, in case a request cached the old row meanwhile.
+    profiles.forget(user_id)
+    transaction.on_commit(lambda: profiles.forget(user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    _forget_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def forget_cached_profile(sender, instance, **kwargs):
+    _forget_user(instance.user_id)
+
+
+def _is_counted_user(profile):
+    return profile.__dict__.get('user_type') in counters.COUNTED_USER_TYPES
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_user_type(sender, instance, **kwargs):
+    instance._counted = _is_counted_user(instance)
+
+
+@receiver(post_save, sender=UserProfile)
+def count_user(sender, instance, created, **kwargs):
+    counted = _is_counted_user(instance)
+    counters.add(counters.USERS, int(counted) - int(not created and instance._counted))
+    instance._counted = counted
+
+
+@receiver(post_delete, sender=UserProfile)
+def uncount_user(sender, instance, **kwargs):
+    if instance._counted:
+        counters.add(counters.USERS, -1)
+
+
+@receiver(post_init, sender=Report)
+def remember_report_state(sender, instance, **kwargs):
+    instance._pending = instance.__dict__.get('is_resolved') is False
+
+
+@receiver(post_save, sender=Report)
+def count_pending_report(sender, instance, created, **kwargs):
+    pending = not instance.is_resolved
+    delta = int(pending) - int(not created and instance._pending)
+    counters.add(counters.PENDING_REPORTS, delta)
+    moderation.count_reports(instance.listing_id, delta)
+    instance._pending = pending
+
+
+@receiver(post_delete, sender=Report)
+def uncount_pending_report(sender, instance, **kwargs):
+    if instance._pending:
+        counters.add(counters.PENDING_REPORTS, -1)
+        moderation.count_reports(instance.listing_id, -1)
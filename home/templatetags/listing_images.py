@@ -0,0 +1,33 @@
+import hashlib
+import json
+
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_src(image, width, sizes=None):
+    """``src``, ``srcset`` and ``sizes`` attributes for ``image`` shown ``width`` CSS pixels wide
+
+    Browsers pick the smallest variant covering ``sizes`` (default
+    ``width``px) at their pixel density; ``src`` is the smallest variant at
+    least ``width`` wide, for those that ignore srcset. Images without
+    variants fall back to the original.
+    """
+    urls = image.variant_urls
+    if not urls:
+        return format_html('src="{}"', image.url)
+    src = next((url for variant_width, url in urls.items() if variant_width >= width), urls[max(urls)])
+    srcset = ', '.join(f'{url} {variant_width}w' for variant_width, url in urls.items())
+    return format_html('src="{}" srcset="{}" sizes="{}"', src, srcset, sizes or f'{width}px')
+
+
+@register.filter
+def image_version(image):
+    """A short token that changes whenever ``image``'s stored file or variants do, for cache keys"""
+    if image is None:
+        return ''
+    state = json.dumps([str(image.image or ''), image.variants], sort_keys=True)
+    return hashlib.md5(state.encode()).hexdigest()[:12]
@@ -1,3 +1,1247 @@
+import asyncio
+import csv
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import cloudinary
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import autocomplete, counters, geo, images, inbox, metrics, moderation, search, search_cache, throttle
+from .events import InProcessBroker, user_channel
+from .forms import HouseListingForm, SearchForm
+from .models import ChatMessage, Comment, HouseImage, HouseListing, Interest, Report, SavedListing, UserProfile
+from .pagination import CursorPaginator
+from .search import filter_listings, search_listings
+
+# A plan line that reads the whole listings table rather than an index.
+FULL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN home_houselisting\s*$', re.MULTILINE),
+    'postgresql': re.compile(r'\bSeq Scan on home_houselisting\b'),
+}
+SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+class ListingQueryPlanTests(TestCase):
+    """EXPLAIN every search permutation the home view can issue"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create(username='owner')
+        for i, (house_type, _) in enumerate(HouseListing.HOUSE_TYPES * 3):
+            HouseListing.objects.create(
+                owner=owner, title=f'Flat {i}', description='Test', house_type=house_type,
+                address=f'Road {i}', area='Dhanmondi', rent=Decimal(4000 + i * 1000),
+                contact_phone='01700000000', contact_email='owner@example.com',
+            )
+
+    def setUp(self):
+        if connection.vendor not in FULL_SCAN:
+            self.skipTest(f'No plan rules for {connection.vendor}')
+        if connection.vendor == 'postgresql':
+            # Tiny test tables make a seq scan cheapest; ask whether an index *could* serve.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def permutations(self):
+        for query, house_type, min_rent, max_rent in itertools.product(
+            ['', 'dhanmondi'], ['', 'family'], [None, Decimal(5000)], [None, Decimal(20000)],
+        ):
+            yield {'query': query, 'house_type': house_type, 'min_rent': min_rent, 'max_rent': max_rent}
+
+    def test_no_search_permutation_scans_the_table(self):
+        for data in self.permutations():
+            with self.subTest(**data):
+                plan = filter_listings(data).explain()
+                self.assertIsNone(FULL_SCAN[connection.vendor].search(plan), f'Full scan for {data}:\n{plan}')
+
+    def test_browse_order_comes_from_the_index(self):
+        for house_type in ['', 'family']:
+            with self.subTest(house_type=house_type):
+                plan = filter_listings({'house_type': house_type}).explain()
+                self.assertIsNone(SORT[connection.vendor].search(plan), f'Sort step for {house_type!r}:\n{plan}')
+
+    def test_location_search_uses_the_geo_index(self):
+        for data in [
+            {'lat': 23.7461, 'lng': 90.3742, 'radius_km': 2, 'sort': 'distance'},
+            {'bbox': (90.37, 23.74, 90.38, 23.75)},
+        ]:
+            with self.subTest(**data):
+                plan = filter_listings(data).explain()
+                self.assertIsNone(FULL_SCAN[connection.vendor].search(plan), plan)
+                if connection.vendor == 'sqlite':
+                    self.assertIn('listing_geo_browse_idx', plan)
+
+    def test_next_page_seeks_instead_of_walking(self):
+        paginator = CursorPaginator(filter_listings({}), 2)
+        first = paginator.get_page(None)
+        last = first[len(first) - 1]
+        deep = paginator.queryset.filter(paginator._beyond([last.created_at, last.id]))
+        plan = deep.explain()
+        self.assertIsNone(FULL_SCAN[connection.vendor].search(plan), plan)
+        if connection.vendor == 'sqlite':
+            self.assertRegex(plan, r'SEARCH home_houselisting USING INDEX listing_browse_idx \(created_at<\?\)')
+
+
+def make_listing(owner, i=0, **kwargs):
+    fields = {
+        'title': f'Flat {i}', 'description': 'Test', 'house_type': 'family',
+        'address': f'Road {i}', 'area': 'Dhanmondi', 'rent': Decimal(4000 + i * 1000),
+        'contact_phone': '01700000000', 'contact_email': 'owner@example.com',
+    }
+    fields.update(kwargs)
+    return HouseListing.objects.create(owner=owner, **fields)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner')
+        cls.gulshan = make_listing(owner, 1, title='Flat near the lake', area='Gulshan', address='Road 5')
+        cls.gulshan_road = make_listing(owner, 2, title='Sunny flat', area='Gulshan', address='Road 11')
+        cls.banani = make_listing(owner, 3, title='Quiet flat', area='Banani', address='Road 11')
+
+    def search(self, query):
+        return list(search_listings(HouseListing.objects.all(), query))
+
+    def assertIndexIntact(self):
+        if connection.vendor == 'sqlite':
+            # Raises if the external-content index disagrees with the listings table.
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}) VALUES ('integrity-check')")
+
+    def test_partial_words_match_the_start_of_words(self):
+        self.assertCountEqual(self.search('gul'), [self.gulshan, self.gulshan_road])
+        self.assertEqual(self.search('ulshan'), [])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('gulshan road 11'), [self.gulshan_road])
+        self.assertEqual(self.search('gulshan quiet'), [])
+
+    def test_better_matches_rank_first(self):
+        owner = self.gulshan.owner
+        lake = make_listing(owner, 4, title='Lake flat', area='Lake Circus', address='Lake Road')
+        # Newer, so it would come first without ranking, but mentions the lake only in a long address.
+        make_listing(owner, 5, title='Flat', area='Baridhara', address='Opposite the park by the lake, Road 9, Block C')
+        results = self.search('lake')
+        self.assertEqual(results[0], lake)
+        self.assertEqual(len(results), 3)
+        self.assertEqual([listing.search_rank for listing in results], sorted(
+            (listing.search_rank for listing in results), reverse=True,
+        ))
+
+    def test_index_follows_saves_updates_and_deletes(self):
+        self.banani.title = 'Bright flat'
+        self.banani.save()
+        self.assertEqual(self.search('bright'), [self.banani])
+        self.assertEqual(self.search('quiet'), [])
+
+        HouseListing.objects.filter(pk=self.gulshan.pk).update(area='Uttara')
+        self.assertEqual(self.search('uttara'), [self.gulshan])
+        self.assertEqual(self.search('gulshan'), [self.gulshan_road])
+
+        self.gulshan_road.delete()
+        self.assertEqual(self.search('gulshan'), [])
+        self.assertIndexIntact()
+
+    def test_substring_search_without_the_fts_table(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('The fallback only applies to SQLite without FTS5')
+        with patch.dict(search._fts_tables, {connection.alias: False}):
+            results = self.search('ulshan')
+        self.assertCountEqual(results, [self.gulshan, self.gulshan_road])
+        self.assertFalse(hasattr(results[0], 'search_rank'))
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner')
+        listings = [make_listing(owner, i, rent=Decimal(5000 + i % 3 * 1000)) for i in range(7)]
+        # Three timestamps for seven listings, so most pages start or end inside a tie.
+        now = timezone.now()
+        for i, listing in enumerate(listings):
+            HouseListing.objects.filter(pk=listing.pk).update(created_at=now - timedelta(days=i % 3))
+
+    def walk(self, queryset, per_page=2):
+        paginator = CursorPaginator(queryset, per_page)
+        pages = [paginator.get_page(None)]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(paginator.get_page(backwards[-1].previous_cursor))
+        return pages, backwards
+
+    def test_cursors_walk_ties_both_ways(self):
+        queryset = HouseListing.objects.order_by('-created_at', '-id')
+        pages, backwards = self.walk(queryset)
+        expected = list(queryset.values_list('pk', flat=True))
+        self.assertEqual([listing.pk for page in pages for listing in page], expected)
+        self.assertEqual([[listing.pk for listing in page] for page in reversed(backwards)],
+                         [[listing.pk for listing in page] for page in pages])
+        self.assertFalse(pages[0].has_previous())
+
+    def test_bad_cursors_give_the_first_page(self):
+        paginator = CursorPaginator(HouseListing.objects.order_by('-created_at', '-id'), 2)
+        first = paginator.get_page(None)
+        cursor = paginator.get_page(first.next_cursor).next_cursor
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        for bad in ['garbage', tampered, first.next_cursor + 'x']:
+            with self.subTest(cursor=bad):
+                self.assertEqual(list(paginator.get_page(bad)), list(first))
+
+    def test_annotations_are_keys(self):
+        queryset = HouseListing.objects.annotate(double_rent=F('rent') * 2).order_by('-double_rent', '-id')
+        pages, backwards = self.walk(queryset)
+        self.assertEqual([listing.pk for page in pages for listing in page], list(queryset.values_list('pk', flat=True)))
+        with CaptureQueriesContext(connection) as queries:
+            CursorPaginator(queryset, 2).get_page(pages[1].next_cursor)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_other_orderings_page_by_offset(self):
+        queryset = HouseListing.objects.order_by('-rent', 'id')
+        pages, backwards = self.walk(queryset, per_page=3)
+        self.assertEqual([listing.pk for page in pages for listing in page], list(queryset.values_list('pk', flat=True)))
+        self.assertEqual([len(page) for page in backwards], [1, 3, 3])
+        with CaptureQueriesContext(connection) as queries:
+            CursorPaginator(queryset, 3).get_page(pages[0].next_cursor)
+        self.assertIn('OFFSET', queries[0]['sql'])
+
+
+class ListingGridQueryTests(TestCase):
+    """Listing grids must not issue queries per card"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        UserProfile.objects.create(user=cls.owner, user_type='owner')
+        cls.renter = User.objects.create_user('renter')
+        UserProfile.objects.create(user=cls.renter, user_type='renter')
+        cls.admin = User.objects.create_user('moderator')
+        UserProfile.objects.create(user=cls.admin, user_type='admin')
+
+    def setUp(self):
+        cloud_name = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name='test')
+        self.addCleanup(cloudinary.config, cloud_name=cloud_name)
+        search_cache.get_cache().clear()
+        caches['template_fragments'].clear()
+
+    def add_listings(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                listing = make_listing(self.owner, i)
+                HouseImage.objects.create(listing=listing, image=f'house_images/cover_{listing.pk}')
+                HouseImage.objects.create(listing=listing, image=f'house_images/extra_{listing.pk}')
+                SavedListing.objects.create(user=self.renter, listing=listing)
+                Interest.objects.create(renter=self.renter, listing=listing)
+
+    def count_queries(self, user, url):
+        if user:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, user, url):
+        self.add_listings(1)
+        few = self.count_queries(user, url)
+        self.add_listings(11)
+        self.assertEqual(self.count_queries(user, url), few)
+
+    def test_home(self):
+        self.assertConstantQueries(None, reverse('home'))
+
+    def test_home_for_renter(self):
+        self.assertConstantQueries(self.renter, reverse('home'))
+
+    def test_listing_state_in_one_query(self):
+        self.add_listings(3)
+        saved, interested, other = HouseListing.objects.order_by('id')
+        SavedListing.objects.filter(listing=interested).delete()
+        Interest.objects.filter(listing=saved).delete()
+        other.savedlisting_set.all().delete()
+        other.interest_set.all().delete()
+        self.client.force_login(self.renter)
+        ids = ','.join(str(listing.pk) for listing in (saved, interested, other))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('listing_state'), {'ids': ids}, HTTP_HOST='localhost')
+        state_queries = [q for q in queries if 'home_savedlisting' in q['sql'] or 'home_interest' in q['sql']]
+        self.assertEqual(len(state_queries), 1)
+        self.assertEqual(response.json(), {'saved': [saved.pk], 'interested': [interested.pk]})
+
+    def test_renter_dashboard(self):
+        self.assertConstantQueries(self.renter, reverse('dashboard'))
+
+    def test_owner_dashboard(self):
+        self.assertConstantQueries(self.owner, reverse('dashboard'))
+
+    def test_admin_dashboard(self):
+        self.assertConstantQueries(self.admin, reverse('dashboard'))
+
+    def test_cached_cards_follow_listing_changes(self):
+        self.add_listings(1)
+        listing = HouseListing.objects.get()
+        self.assertContains(self.client.get(reverse('home'), HTTP_HOST='localhost'), f'cover_{listing.pk}')
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.title = 'Renovated flat'
+            listing.save()
+            listing.cover_image.delete()
+        response = self.client.get(reverse('home'), HTTP_HOST='localhost')
+        self.assertContains(response, 'Renovated flat')
+        self.assertContains(response, f'extra_{listing.pk}')
+        self.assertNotContains(response, f'cover_{listing.pk}')
+
+    def test_cached_cards_follow_cover_variants(self):
+        self.add_listings(1)
+        listing = HouseListing.objects.get()
+        self.client.force_login(self.renter)
+        for url in (reverse('home'), reverse('dashboard')):
+            self.assertNotContains(self.client.get(url, HTTP_HOST='localhost'), 'srcset')
+        # What the variant backfill writes: the same cover, new variants and nothing else.
+        cover = listing.cover_image
+        cover.variants = {'160': f'house_images/cover_{listing.pk}_160', '480': f'house_images/cover_{listing.pk}_480'}
+        cover.save(update_fields=['variants'])
+        self.assertContains(self.client.get(reverse('home'), HTTP_HOST='localhost'), f'cover_{listing.pk}_480')
+        self.assertContains(self.client.get(reverse('dashboard'), HTTP_HOST='localhost'), f'cover_{listing.pk}_160')
+
+    def test_cover_image_follows_image_changes(self):
+        listing = make_listing(self.owner)
+        first = HouseImage.objects.create(listing=listing, image='house_images/first')
+        second = HouseImage.objects.create(listing=listing, image='house_images/second')
+        listing.refresh_from_db()
+        self.assertEqual(listing.cover_image, first)
+        first.delete()
+        listing.refresh_from_db()
+        self.assertEqual(listing.cover_image, second)
+        second.delete()
+        listing.refresh_from_db()
+        self.assertIsNone(listing.cover_image)
+
+
+class PlatformCounterTests(TestCase):
+    def test_counters_match_a_full_recount(self):
+        owner = User.objects.create_user('owner')
+        UserProfile.objects.create(user=owner, user_type='owner')
+        renter = User.objects.create_user('renter')
+        profile = UserProfile.objects.create(user=renter, user_type='renter')
+        UserProfile.objects.create(user=User.objects.create_user('moderator'), user_type='admin')
+        listings = [make_listing(owner, i) for i in range(3)]
+        reports = [Report.objects.create(listing=listing, reporter=renter, reason='Fake') for listing in listings]
+        reports[0].is_resolved = True
+        reports[0].save()
+        listings[1].delete()
+        profile.user_type = 'admin'
+        profile.save()
+
+        today = counters.listings_on(timezone.localdate())
+        expected = {counters.LISTINGS: 2, counters.USERS: 1, counters.PENDING_REPORTS: 1, today: 2}
+        self.assertEqual(counters.read(*expected), expected)
+        recount = counters.rebuild()
+        self.assertEqual({name: recount[name] for name in expected}, expected)
+
+    def test_admin_dashboard_reads_counters_and_groups_reports(self):
+        admin = User.objects.create_user('moderator')
+        UserProfile.objects.create(user=admin, user_type='admin')
+        listing = make_listing(admin)
+        for i in range(12):
+            Report.objects.create(listing=listing, reporter=admin, reason=f'Report {i}')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'), HTTP_HOST='localhost')
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'].upper()])
+        self.assertEqual(response.context['pending_reports'], 12)
+        self.assertEqual(response.context['new_listings_today'], 1)
+        [reported] = response.context['reported_listings']
+        self.assertEqual(reported.pending_report_count, 12)
+        self.assertEqual([r.reason for r in reported.latest_reports], ['Report 11', 'Report 10', 'Report 9'])
+
+
+class ModerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('moderator')
+        UserProfile.objects.create(user=cls.admin, user_type='admin')
+        cls.owner = User.objects.create_user('owner')
+        cls.renters = [User.objects.create_user(f'renter{i}') for i in range(3)]
+        cls.listings = [make_listing(cls.owner, i) for i in range(3)]
+
+    def setUp(self):
+        settings_override = self.settings(HOME_REPORT_HIDE_THRESHOLD=3, HOME_PURGE_IN_BACKGROUND=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def report(self, listing, count):
+        for renter in self.renters[:count]:
+            Report.objects.create(listing=listing, reporter=renter, reason='Spam')
+
+    def test_listings_hide_at_the_threshold(self):
+        first, second, _ = self.listings
+        self.report(first, 3)
+        self.report(second, 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.pending_report_count, first.is_reported), (3, True))
+        self.assertEqual((second.pending_report_count, second.is_reported), (2, False))
+
+        report = Report.objects.filter(listing=first).first()
+        report.is_resolved = True
+        report.save()
+        first.refresh_from_db()
+        self.assertEqual(first.pending_report_count, 2)
+        HouseListing.objects.update(pending_report_count=0)
+        moderation.rebuild_report_counts()
+        self.assertEqual(
+            dict(HouseListing.objects.values_list('pk', 'pending_report_count')),
+            {first.pk: 2, second.pk: 2, self.listings[2].pk: 0},
+        )
+
+    def test_bulk_dismiss_and_remove(self):
+        first, second, third = self.listings
+        for listing in self.listings:
+            self.report(listing, 3)
+        ChatMessage.objects.create(listing=second, sender=self.renters[0], receiver=self.owner, message='Hi')
+        Comment.objects.create(listing=second, author=self.renters[0], content='Fake')
+        self.client.force_login(self.admin)
+        url = reverse('moderate_reports')
+
+        # Reports, the pending counter and the listings: one UPDATE each, however many reports there are.
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {'listings': [first.pk], 'action': 'dismiss'}, HTTP_HOST='localhost')
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 3)
+        first.refresh_from_db()
+        self.assertEqual((first.pending_report_count, first.is_reported), (0, False))
+        self.assertFalse(Report.objects.filter(listing=first, is_resolved=False).exists())
+        self.assertEqual(counters.read(counters.PENDING_REPORTS)[counters.PENDING_REPORTS], 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'listings': [second.pk, third.pk], 'action': 'remove'}, HTTP_HOST='localhost')
+        self.assertEqual(list(HouseListing.objects.values_list('pk', flat=True)), [first.pk])
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(counters.read(counters.PENDING_REPORTS)[counters.PENDING_REPORTS], 0)
+
+    def test_dismiss_leaves_removed_listings_hidden(self):
+        removed, kept, _ = self.listings
+        self.report(kept, 3)
+        # The purge is still pending: its on_commit callback never runs here.
+        moderation.remove([removed.pk])
+        Report.objects.create(listing=removed, reporter=self.renters[0], reason='Spam')
+
+        self.assertEqual(moderation.dismiss([removed.pk, kept.pk]), 3)
+        removed.refresh_from_db()
+        kept.refresh_from_db()
+        self.assertTrue(removed.is_reported)
+        self.assertTrue(Report.objects.filter(listing=removed, is_resolved=False).exists())
+        self.assertEqual((kept.pending_report_count, kept.is_reported), (0, False))
+        self.assertNotIn(removed, filter_listings({}))
+
+    def test_removed_listings_leave_the_dashboards(self):
+        removed, kept, _ = self.listings
+        moderation.remove([removed.pk])
+        UserProfile.objects.create(user=self.owner, user_type='owner')
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('dashboard'), HTTP_HOST='localhost')
+        self.assertNotIn(removed, response.context['recent_listings'])
+        self.assertIn(kept, response.context['recent_listings'])
+
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('dashboard'), HTTP_HOST='localhost')
+        self.assertNotIn(removed, response.context['listings'])
+        url = reverse('update_listing_status', args=[removed.pk])
+        response = self.client.post(url, {'status': 'booked'}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 404)
+        removed.refresh_from_db()
+        self.assertEqual(removed.status, 'available')
+
+
+class ImportListingsTests(TestCase):
+    def test_valid_rows_are_imported_and_the_rest_rejected(self):
+        owner = User.objects.create_user('agency')
+        rows = [
+            {'title': f'Flat {i}', 'description': 'Imported', 'house_type': 'family', 'address': f'Road {i}',
+             'area': 'Uttara', 'rent': 9000 + i, 'contact_phone': '01700000000', 'contact_email': 'agency@example.com'}
+            for i in range(5)
+        ]
+        rows[1]['house_type'] = 'castle'
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        path = os.path.join(workdir, 'listings.jsonl')
+        with open(path, 'w') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+            f.write('not json\n')
+
+        call_command('import_listings', path, owner='agency', batch_size=2, stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertEqual(
+            list(HouseListing.objects.filter(owner=owner).order_by('id').values_list('title', flat=True)),
+            ['Flat 0', 'Flat 2', 'Flat 3', 'Flat 4'],
+        )
+        with open(f'{path}.rejects.jsonl') as f:
+            rejects = [json.loads(line) for line in f]
+        self.assertEqual([r['line'] for r in rejects], [2, 6])
+        self.assertIn('house_type', rejects[0]['errors'])
+        self.assertEqual(counters.read(counters.LISTINGS), {counters.LISTINGS: 4})
+        self.assertEqual(filter_listings({'query': 'uttara'}).count(), 4)
+
+    def test_missing_file_is_a_command_error(self):
+        User.objects.create_user('agency')
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        path = os.path.join(workdir, 'missing.jsonl')
+        with self.assertRaisesMessage(CommandError, 'missing.jsonl'):
+            call_command('import_listings', path, owner='agency', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(os.listdir(workdir), [])
+
+    def test_stdin_is_left_open(self):
+        User.objects.create_user('agency')
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        stdin = io.StringIO('not json\n')
+        with patch('sys.stdin', stdin):
+            call_command(
+                'import_listings', '-', owner='agency', rejects=os.path.join(workdir, 'rejects.jsonl'),
+                stdout=io.StringIO(), stderr=io.StringIO(),
+            )
+        self.assertFalse(stdin.closed)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        UserProfile.objects.create(user=cls.owner, user_type='owner')
+        cls.admin = User.objects.create_user('moderator')
+        UserProfile.objects.create(user=cls.admin, user_type='admin')
+        make_listing(cls.owner, 0)
+        make_listing(cls.owner, 1, status='booked')
+
+    def test_admin_streams_filtered_csv(self):
+        self.client.force_login(self.admin)
+        url = reverse('export_data', args=['listings', 'csv'])
+        response = self.client.get(url, {'status__exact': 'booked'}, HTTP_HOST='localhost')
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="listings-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'title'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('booked', lines[1])
+
+        response = self.client.get(url, {'bogus': '1'}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bogus', response.json()['errors'])
+
+    def test_csv_cells_never_run_as_formulas(self):
+        listing = make_listing(self.owner, 2, title='=HYPERLINK("http://evil.example","x")')
+        reporter = User.objects.create_user('renter')
+        for reason in ['+1', '-2+3', '@SUM(A1)', '\tTab', '\rReturn', 'Fine - really']:
+            Report.objects.create(listing=listing, reporter=reporter, reason=reason)
+        out = io.StringIO()
+        call_command('export_data', 'reports', format='csv', stdout=out)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual([row[2] for row in rows[1:]], [f"'{listing.title}"] * 6)
+        self.assertEqual([row[4] for row in rows[1:]], ["'+1", "'-2+3", "'@SUM(A1)", "'\tTab", "'\rReturn", 'Fine - really'])
+
+        out = io.StringIO()
+        call_command('export_data', 'reports', format='jsonl', stdout=out)
+        self.assertEqual(json.loads(out.getvalue().splitlines()[0])['reason'], '+1')
+
+    def test_export_is_admin_only(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('export_data', args=['chat', 'jsonl']), HTTP_HOST='localhost')
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+    def test_command_writes_jsonl(self):
+        out = io.StringIO()
+        call_command('export_data', 'listings', format='jsonl', filter=['status__exact=available'], stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['status'] for row in rows], ['available'])
+
+
+class PerfToolsTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        call_command(
+            'seed_perf', users=20, listings=40, comments=40, messages=60, reports=5, saved=20,
+            stdout=io.StringIO(),
+        )
+
+    def test_seed_perf_keeps_derived_data_consistent(self):
+        self.assertEqual(UserProfile.objects.filter(user__username__startswith='perf_').count(), 21)
+        self.assertFalse(HouseListing.objects.filter(cover_image=None, images__isnull=False).exists())
+        self.assertEqual(counters.read(counters.LISTINGS)[counters.LISTINGS], 40)
+        with self.assertRaises(CommandError):
+            call_command('seed_perf', stdout=io.StringIO())
+
+    def test_bench_views_compares_against_baseline(self):
+        baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(baseline))
+        options = {'repeat': 2, 'warmup': 1, 'baseline': baseline, 'stdout': io.StringIO()}
+        call_command('bench_views', save_baseline=True, **options)
+        with open(baseline) as f:
+            results = json.load(f)
+        self.assertIn('dashboard_owner', results)
+        self.assertGreater(results['chat_view_owner']['queries'], 0)
+
+        results['home']['queries'] -= 1
+        with open(baseline, 'w') as f:
+            json.dump(results, f)
+        with self.assertRaisesMessage(CommandError, 'home'):
+            call_command('bench_views', only=['home'], **options)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_metrics_sum_every_worker(self):
+        # Another worker's flushed totals: two requests to home with 3 queries in all.
+        other = [['findhome_request_db_queries', [['view', 'home']], [0, 1, 1, 0, 0, 0, 0, 0, 0, 0, 3]]]
+        with open(os.path.join(self.directory, 'other.json'), 'w') as f:
+            json.dump(other, f)
+        with self.settings(HOME_METRICS_DIR=self.directory, HOME_METRICS_TOKEN='secret'), \
+                patch.dict(metrics._values, clear=True):
+            self.client.get(reverse('home'), HTTP_HOST='localhost')
+            response = self.client.get(reverse('metrics'), HTTP_HOST='localhost', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+            body = response.content.decode()
+            self.assertIn('findhome_request_db_queries_count{view="home"} 3', body)
+            self.assertIn('findhome_request_duration_seconds_count{view="home",method="GET",status="200"} 1', body)
+            self.assertIn('findhome_request_template_seconds_count{view="home"} 1', body)
+
+            response = self.client.get(reverse('metrics'), HTTP_HOST='localhost', HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, 403)
+
+    def test_slow_queries_are_logged(self):
+        with self.settings(HOME_METRICS_DIR=self.directory, HOME_METRICS_SLOW_QUERY_MS=0.000001):
+            listing = make_listing(User.objects.create_user('owner'))
+            with self.assertLogs('home.metrics', 'WARNING') as logs:
+                self.client.get(reverse('listing_detail', args=[listing.pk]), HTTP_HOST='localhost')
+        self.assertIn('Slow query', logs.output[0])
+
+
+class SearchCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.listings = [make_listing(cls.owner, i) for i in range(3)]
+
+    def setUp(self):
+        search_cache.get_cache().clear()
+
+    def search(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'), params, HTTP_HOST='localhost')
+        return [listing.pk for listing in response.context['listings']], len(queries)
+
+    def test_repeat_search_is_served_from_cache(self):
+        ids, miss_queries = self.search(house_type='family', max_rent='5000.00')
+        self.assertEqual(self.search(house_type='family', max_rent='5000'), (ids, 1))
+        self.assertLess(1, miss_queries)
+        self.assertEqual(search_cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_only_result_changes_invalidate(self):
+        ids, _ = self.search()
+        listing = HouseListing.objects.get(pk=self.listings[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.description = 'Freshly painted'
+            listing.save()
+        self.assertEqual(self.search()[1], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.status = 'booked'
+            listing.save()
+        new_ids, _ = self.search()
+        self.assertEqual(new_ids, [pk for pk in ids if pk != listing.pk])
+        self.assertEqual(search_cache.stats()['misses'], 2)
+
+
+class GeoSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner')
+        # Dhanmondi, ~1.1 km north of it, and Uttara ~14 km away.
+        cls.centre = make_listing(owner, 0, latitude=23.7461, longitude=90.3742)
+        cls.north = make_listing(owner, 1, latitude=23.7561, longitude=90.3742)
+        cls.far = make_listing(owner, 2, latitude=23.8759, longitude=90.3795)
+        make_listing(owner, 3)
+
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        search_cache.get_cache().clear()
+
+    def search(self, **params):
+        response = self.client.get(reverse('home'), params, HTTP_HOST='localhost')
+        return list(response.context['listings'])
+
+    def test_radius_search_sorted_by_distance(self):
+        listings = self.search(lat='23.7461', lng='90.3742', radius_km='3', sort='distance')
+        self.assertEqual([listing.pk for listing in listings], [self.centre.pk, self.north.pk])
+        self.assertAlmostEqual(listings[1].distance_km, 1.11, places=2)
+        self.assertEqual(self.centre.geo_row, geo.grid_row(23.7461))
+
+        listings = self.search(lat='23.7561', lng='90.3742', radius_km='20', sort='distance')
+        self.assertEqual([listing.pk for listing in listings], [self.north.pk, self.centre.pk, self.far.pk])
+
+    def test_nearest_first_pages_cover_the_whole_radius(self):
+        owner = User.objects.get(username='owner')
+        # Enough listings around the centre for two pages, then the far one.
+        for i in range(14):
+            make_listing(owner, 10 + i, latitude=23.7461 + i * 0.001, longitude=90.3742)
+        params = {'lat': '23.7461', 'lng': '90.3742', 'radius_km': '20', 'sort': 'distance'}
+        first = self.client.get(reverse('home'), params, HTTP_HOST='localhost').context['listings']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'), dict(params, cursor=first.next_cursor), HTTP_HOST='localhost')
+        second = response.context['listings']
+        self.assertFalse(second.has_next())
+        distances = [listing.distance_km for listing in [*first, *second]]
+        self.assertEqual(len(distances), 17)
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual(second[-1].pk, self.far.pk)
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+
+    def test_bounding_box(self):
+        listings = self.search(bbox='90.30,23.85,90.45,23.90')
+        self.assertEqual([listing.pk for listing in listings], [self.far.pk])
+        form = SearchForm({'bbox': '90.45,23.85,90.30,23.90'})
+        self.assertIn('bbox', form.errors)
+
+    def test_listing_form_places_known_areas(self):
+        data = {
+            'title': 'Flat', 'description': 'Test', 'house_type': 'family', 'address': 'Road 1',
+            'area': ' Gulshan ', 'rent': '5000', 'contact_phone': '01700000000', 'contact_email': 'a@example.com',
+        }
+        form = HouseListingForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual((form.cleaned_data['latitude'], form.cleaned_data['longitude']), geo.AREA_CENTROIDS['gulshan'])
+        self.assertFalse(HouseListingForm(dict(data, latitude='23.7')).is_valid())
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner')
+        # Rents 4000, 5000, ... 9000: a family and a bachelor flat in each of three areas.
+        for i, (area, house_type) in enumerate(itertools.product(
+            ['Dhanmondi', 'gulshan ', 'Banani'], ['family', 'bachelor_male'],
+        )):
+            make_listing(owner, i, area=area, house_type=house_type)
+        make_listing(owner, 9, status='booked')
+
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+        search_cache.get_cache().clear()
+
+    def facets(self, **params):
+        form = SearchForm(params)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.cleaned_data
+
+    def test_each_facet_ignores_its_own_filter(self):
+        data = self.facets(house_type='family', max_rent='6000')
+        with self.assertNumQueries(1):
+            facets = search_cache.cached_facets(data)
+        types = {value: count for value, _, count in facets['house_type']}
+        self.assertEqual(types, {'bachelor_male': 1, 'bachelor_female': 0, 'family': 2})
+        self.assertEqual([count for *_, count in facets['rent']], [1, 2, 0, 0, 0])
+        self.assertEqual(facets['areas'], [('Dhanmondi', 1), ('Gulshan', 1)])
+        self.assertEqual(facets['total'], 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(search_cache.cached_facets(data), facets)
+
+    def test_home_links_facets(self):
+        response = self.client.get(reverse('home'), {'query': 'gulshan'}, HTTP_HOST='localhost')
+        self.assertEqual(response.context['facets']['areas'], [('Gulshan', 2)])
+        self.assertContains(response, '?query=gulshan&amp;house_type=family')
+        self.assertContains(response, '?query=gulshan&amp;min_rent=5000&amp;max_rent=9999.99')
+
+    def test_result_count_needs_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'), {'max_rent': '8000'}, HTTP_HOST='localhost')
+        self.assertContains(response, '5 properties found')
+        self.assertFalse([q for q in queries if 'COUNT(*)' in q['sql']])
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        for i, area in enumerate(['Gulshan', 'gulshan  ', 'Gulistan', 'Banani', 'Gulshan']):
+            make_listing(cls.owner, i, area=area)
+        make_listing(cls.owner, 5, area='Gulbahar', status='booked')
+
+    def setUp(self):
+        autocomplete.reset()
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse('area_suggestions'), {'q': q, **params}, HTTP_HOST='localhost')
+        return [(item['area'], item['count']) for item in response.json()['areas']]
+
+    def test_prefix_suggestions_busiest_first(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.suggest('gul'), [('Gulshan', 3), ('Gulistan', 1)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest(' GULS'), [('Gulshan', 3)])
+            self.assertEqual(self.suggest('g', limit=1), [('Gulshan', 3)])
+            self.assertEqual(self.suggest('x'), [])
+
+    def test_listing_changes_update_the_index(self):
+        self.suggest('gul')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_listing(self.owner, 6, area='Gulistan')
+            make_listing(self.owner, 7, area='Gulistan')
+            listing = HouseListing.objects.get(area='Gulbahar')
+            listing.status = 'available'
+            listing.save()
+            HouseListing.objects.filter(area='Banani').get().delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('gul'), [('Gulistan', 3), ('Gulshan', 3), ('Gulbahar', 1)])
+            self.assertEqual(self.suggest('b'), [])
+
+    def test_many_areas_remember_busy_prefixes(self):
+        index = autocomplete.AreaIndex({f'g{i:03}': [f'G{i:03}', i] for i in range(1, 200)})
+        self.assertEqual(index.suggest('g', 2), [('G199', 199), ('G198', 198)])
+        self.assertIn('g', index.memo)
+        index.add('g050', 500)
+        self.assertEqual(index.suggest('g', 1), [('G050', 550)])
+        index.add('g050', -550)
+        self.assertNotIn('g', index.memo)
+        self.assertEqual(index.suggest('g0', 1), [('G099', 99)])
+
+
+class ProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('renter')
+        cls.profile = UserProfile.objects.create(user=cls.user, user_type='renter')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_user_and_profile_come_from_the_cache(self):
+        self.client.get(reverse('listing_state'), {'ids': '1'}, HTTP_HOST='localhost')
+        # The session, then the saved/interest lookup itself; no user or profile queries.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('listing_state'), {'ids': '1'}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+        self.assertIn('django_session', queries[0]['sql'])
+        self.assertFalse([q for q in queries if 'auth_user' in q['sql'] or 'home_userprofile' in q['sql']])
+
+    def test_role_changes_apply_to_the_next_request(self):
+        url = reverse('create_listing')
+        response = self.client.get(url, HTTP_HOST='localhost')
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.profile.user_type = 'owner'
+        self.profile.save()
+        self.assertEqual(self.client.get(url, HTTP_HOST='localhost').status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(url, HTTP_HOST='localhost')
+        self.assertRedirects(response, f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.listing = make_listing(cls.owner)
+
+    def add_threads(self, count, replies=2):
+        for i in range(count):
+            author = User.objects.create_user(f'asker{Comment.objects.count()}')
+            comment = Comment.objects.create(listing=self.listing, author=author, content=f'Question {i}')
+            for j in range(replies):
+                replier = User.objects.create_user(f'replier{Comment.objects.count()}')
+                Comment.objects.create(listing=self.listing, author=replier, parent=comment, content=f'Answer {j}')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('listing_detail', args=[self.listing.pk]), HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_detail_queries_do_not_grow_with_threads(self):
+        self.add_threads(1)
+        few = self.count_queries()
+        self.add_threads(5, replies=4)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_older_threads_load_a_page_at_a_time(self):
+        self.add_threads(12, replies=1)
+        response = self.client.get(reverse('listing_detail', args=[self.listing.pk]), HTTP_HOST='localhost')
+        first = response.context['comments']
+        self.assertEqual([c.content for c in first], [f'Question {i}' for i in range(11, 1, -1)])
+        self.assertEqual([r.content for r in first[0].thread_replies], ['Answer 0'])
+
+        response = self.client.get(
+            reverse('listing_comments', args=[self.listing.pk]), {'cursor': first.next_cursor}, HTTP_HOST='localhost',
+        )
+        rest = response.context['comments']
+        self.assertEqual([c.content for c in rest], ['Question 1', 'Question 0'])
+        self.assertFalse(rest.has_next())
+        self.assertNotContains(response, 'No comments yet')
+
+
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        UserProfile.objects.create(user=cls.owner, user_type='owner')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.staging = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging)
+        self.settings_override = self.settings(
+            MEDIA_ROOT=media, HOME_IMAGE_STAGING_ROOT=self.staging,
+            HOME_IMAGE_STORAGE='home.images.LocalImageStorage', HOME_IMAGE_UPLOAD_WORKERS=0,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        patcher = patch.object(images, '_storage', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.owner)
+
+    def jpeg(self, size=(1200, 800)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    def create_listing(self):
+        data = {
+            'title': 'Lake view flat', 'description': 'Test', 'house_type': 'family', 'address': 'Road 1',
+            'area': 'Dhanmondi', 'rent': '12000', 'contact_phone': '01700000000',
+            'contact_email': 'owner@example.com',
+            'images': [SimpleUploadedFile(f'photo{i}.jpg', self.jpeg(), 'image/jpeg') for i in range(3)],
+        }
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('create_listing'), data, HTTP_HOST='localhost')
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        listing = HouseListing.objects.get()
+        self.assertEqual(set(listing.images.values_list('status', flat=True)), {'processing'})
+        self.assertIsNone(listing.cover_image)
+        return listing, callbacks
+
+    def test_listing_is_saved_before_photos_upload(self):
+        listing, callbacks = self.create_listing()
+        self.assertEqual(len(os.listdir(self.staging)), 3)
+        for callback in callbacks:
+            callback()
+
+        first = listing.images.order_by('id').first()
+        listing.refresh_from_db()
+        self.assertEqual(listing.cover_image, first)
+        self.assertEqual(set(listing.images.values_list('status', flat=True)), {'ready'})
+        self.assertEqual(os.listdir(self.staging), [])
+        self.assertTrue(first.url.startswith('/media/house_images/'))
+
+        self.assertEqual(list(first.variant_urls), [160, 480, 960])
+        with Image.open(os.path.join(settings.MEDIA_ROOT, first.variants['160'])) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), (images.VARIANT_FORMAT, (160, 107)))
+        response = self.client.get(reverse('listing_detail', args=[listing.pk]), HTTP_HOST='localhost')
+        self.assertContains(response, f'src="{first.variant_urls[960]}" srcset="{first.variant_urls[160]} 160w, ')
+
+    def test_uploads_are_checked_and_named_by_their_format(self):
+        png = io.BytesIO()
+        Image.new('RGB', (10, 10), 'teal').save(png, 'PNG')
+        data = {
+            'title': 'Lake view flat', 'description': 'Test', 'house_type': 'family', 'address': 'Road 1',
+            'area': 'Dhanmondi', 'rent': '12000', 'contact_phone': '01700000000',
+            'contact_email': 'owner@example.com',
+        }
+        fake = SimpleUploadedFile('photo.jpg', b'<script>alert(1)</script>', 'image/jpeg')
+        response = self.client.post(reverse('create_listing'), dict(data, images=[fake]), HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('photo.jpg is not a JPEG, PNG or GIF image.', response.context['form'].non_field_errors())
+        self.assertFalse(HouseListing.objects.exists())
+        self.assertEqual(os.listdir(self.staging), [])
+
+        renamed = SimpleUploadedFile('photo.html', png.getvalue(), 'text/html')
+        response = self.client.post(reverse('create_listing'), dict(data, images=[renamed]), HTTP_HOST='localhost')
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertTrue(HouseImage.objects.get().staged_file.endswith('.png'))
+
+    def test_failed_upload_keeps_the_staged_file(self):
+        listing, callbacks = self.create_listing()
+        with patch('home.images.LocalImageStorage.upload', side_effect=OSError('storage down')):
+            with self.assertLogs('home.images', 'ERROR'):
+                for callback in callbacks:
+                    callback()
+        self.assertEqual(set(listing.images.values_list('status', flat=True)), {'failed'})
+        self.assertEqual(len(os.listdir(self.staging)), 3)
+
+    def test_backfill_resizes_old_photos_and_refreshes_cached_cards(self):
+        caches['template_fragments'].clear()
+        search_cache.get_cache().clear()
+        listing = make_listing(self.owner)
+        old = HouseImage.objects.create(listing=listing, image='house_images/old')
+        lost = HouseImage.objects.create(listing=listing, image='house_images/lost')
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'house_images'))
+        with open(os.path.join(settings.MEDIA_ROOT, 'house_images', 'old.jpg'), 'wb') as f:
+            f.write(self.jpeg())
+        self.assertNotContains(self.client.get(reverse('home'), HTTP_HOST='localhost'), 'srcset')
+
+        out = io.StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('1 images resized, 1 originals not found, 0 failed', out.getvalue())
+        old.refresh_from_db()
+        lost.refresh_from_db()
+        self.assertEqual(sorted(old.variants, key=int), ['160', '480', '960'])
+        self.assertEqual(lost.variants, {})
+        # The card cached above is keyed on the cover's variants, so it is rendered afresh.
+        self.assertContains(self.client.get(reverse('home'), HTTP_HOST='localhost'), old.variant_urls[480])
+
+
+class ChatUpdatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        UserProfile.objects.create(user=cls.owner, user_type='owner')
+        cls.renter = User.objects.create_user('renter')
+        UserProfile.objects.create(user=cls.renter, user_type='renter')
+        cls.listing = make_listing(cls.owner)
+
+    def send(self, sender, receiver, text):
+        return ChatMessage.objects.create(listing=self.listing, sender=sender, receiver=receiver, message=text)
+
+    def test_only_new_messages_are_delivered_and_marked_read(self):
+        old = self.send(self.owner, self.renter, 'Hello')
+        new = self.send(self.owner, self.renter, 'Still available')
+        self.client.force_login(self.renter)
+        url = reverse('chat_updates', args=[self.listing.pk])
+
+        response = self.client.get(url, HTTP_HOST='localhost', HTTP_IF_NONE_MATCH=f'"{old.pk}"')
+        self.assertEqual([m['id'] for m in response.json()['messages']], [new.pk])
+        self.assertEqual(response['ETag'], f'"{new.pk}"')
+        old.refresh_from_db()
+        new.refresh_from_db()
+        self.assertFalse(old.is_read)
+        self.assertTrue(new.is_read)
+
+        response = self.client.get(url, HTTP_HOST='localhost', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_owner_must_name_the_renter(self):
+        self.client.force_login(self.owner)
+        url = reverse('chat_updates', args=[self.listing.pk])
+        self.assertEqual(self.client.get(url, HTTP_HOST='localhost').status_code, 400)
+        response = self.client.get(url, {'renter_id': self.renter.pk, 'after': 0}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 304)
+
+    def test_history_loads_in_pages_and_marks_only_shown_messages_read(self):
+        cloudinary.config(cloud_name='test')
+        sent = ChatMessage.objects.bulk_create([
+            ChatMessage(listing=self.listing, sender=self.owner, receiver=self.renter, message=f'Message {i}')
+            for i in range(60)
+        ])
+        ids = [message.pk for message in sent]
+        self.client.force_login(self.renter)
+
+        response = self.client.get(reverse('chat_view', args=[self.listing.pk]), HTTP_HOST='localhost')
+        self.assertEqual([m.pk for m in response.context['messages']], ids[10:])
+        unread = ChatMessage.objects.filter(is_read=False).values_list('pk', flat=True)
+        self.assertEqual(sorted(unread), ids[:10])
+
+        url = reverse('chat_history', args=[self.listing.pk])
+        data = self.client.get(url, {'cursor': response.context['older_cursor']}, HTTP_HOST='localhost').json()
+        self.assertEqual([m['id'] for m in data['messages']], ids[:10])
+        self.assertIsNone(data['cursor'])
+        self.assertFalse(ChatMessage.objects.filter(is_read=False).exists())
+
+
+class InboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        UserProfile.objects.create(user=cls.owner, user_type='owner')
+        cls.first = make_listing(cls.owner, 0)
+        cls.second = make_listing(cls.owner, 1)
+        cls.renters = [User.objects.create_user(f'renter{i}') for i in range(3)]
+        for renter in cls.renters:
+            UserProfile.objects.create(user=renter, user_type='renter')
+
+    def setUp(self):
+        cloudinary.config(cloud_name='test')
+
+    def send(self, listing, sender, receiver, text, is_read=False):
+        return ChatMessage.objects.create(listing=listing, sender=sender, receiver=receiver, message=text, is_read=is_read)
+
+    def test_one_row_per_listing_and_counterpart(self):
+        a, b, c = self.renters
+        self.send(self.first, a, self.owner, 'Hi', is_read=True)
+        self.send(self.first, a, self.owner, 'Still there?')
+        self.send(self.second, a, self.owner, 'And this one?')
+        self.send(self.first, b, self.owner, 'Hello')
+        self.send(self.first, b, self.owner, 'Any news?')
+        last = self.send(self.first, self.owner, b, 'Yes, come on Friday')
+        self.send(self.first, c, a, 'Unrelated')
+
+        page = inbox.get_page(self.owner, None, per_page=2)
+        rows = [(row['listing_id'], row['counterpart'], row['unread']) for row in page]
+        self.assertEqual(rows, [(self.first.pk, b, 2), (self.second.pk, a, 1)])
+        self.assertEqual(page[0]['message'], last)
+
+        with CaptureQueriesContext(connection) as queries:
+            page = inbox.get_page(self.owner, page.next_cursor, per_page=2)
+        self.assertEqual([(row['listing_id'], row['counterpart'], row['unread']) for row in page], [(self.first.pk, a, 1)])
+        self.assertFalse(page.has_next())
+        # Later pages seek past the previous page's latest message instead of skipping rows.
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+        self.assertIn('HAVING', queries[0]['sql'])
+
+        page = inbox.get_page(self.owner, page.previous_cursor, per_page=2)
+        self.assertEqual([row['listing_id'] for row in page], [self.first.pk, self.second.pk])
+        self.assertFalse(page.has_previous())
+
+    def test_inbox_page(self):
+        renter = self.renters[0]
+        self.send(self.first, self.owner, renter, 'Welcome')
+        self.client.force_login(renter)
+        self.client.get(reverse('chat_inbox'), HTTP_HOST='localhost')
+        # The session, the conversations, then their latest messages.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('chat_inbox'), HTTP_HOST='localhost')
+        self.assertContains(response, reverse('chat_view', args=[self.first.pk]) + '"')
+        self.assertContains(response, 'Welcome')
+
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('chat_inbox'), HTTP_HOST='localhost')
+        self.assertContains(response, f"{reverse('chat_view', args=[self.first.pk])}?renter_id={renter.pk}")
+        self.assertContains(response, 'You: Welcome')
+
+
+class EventBrokerTests(TestCase):
+    def test_send_message_pushes_to_the_receiver(self):
+        owner = User.objects.create_user('owner')
+        renter = User.objects.create_user('renter')
+        listing = make_listing(owner)
+        broker = InProcessBroker()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        async def subscribe():
+            return broker.subscribe(user_channel(owner.pk))
+
+        queue = loop.run_until_complete(subscribe())
+        self.client.force_login(renter)
+        with patch('home.events.get_broker', return_value=broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse('send_message', args=[listing.pk]),
+                    {'receiver_id': owner.pk, 'message': 'Hi'}, HTTP_HOST='localhost',
+                )
+        event = loop.run_until_complete(asyncio.wait_for(queue.get(), 1))
+        self.assertEqual(event['type'], 'chat.message')
+        self.assertEqual(event['data']['sender'], renter.pk)
+        self.assertEqual(event['data']['listing'], listing.pk)
+
+
+class ThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.renters = [User.objects.create_user(f'renter{i}') for i in range(2)]
+        cls.listing = make_listing(cls.owner)
+
+    def setUp(self):
+        settings_override = self.settings(HOME_THROTTLE_ENABLED=True, HOME_THROTTLE_RATES={
+            'chat': {'user': '2/min', 'ip': '3/min'},
+            'comment': {'user': '5/min', 'ip': '5/min'},
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        throttle.get_cache().clear()
+
+    def send(self, renter, **extra):
+        self.client.force_login(renter)
+        return self.client.post(
+            reverse('send_message', args=[self.listing.pk]),
+            {'receiver_id': self.owner.pk, 'message': 'Hi'}, HTTP_HOST='localhost', **extra,
+        )
+
+    def test_users_and_addresses_have_their_own_buckets(self):
+        first, second = self.renters
+        with patch.dict(metrics._values, clear=True):
+            self.assertEqual([self.send(first).status_code for _ in range(3)], [200, 200, 429])
+            response = self.send(first)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '30')
+            self.assertEqual(response.json()['retry_after'], 30)
+            # Another user at the same address gets the one request left for it.
+            self.assertEqual([self.send(second).status_code for _ in range(2)], [200, 429])
+            self.assertEqual(self.send(second, REMOTE_ADDR='10.0.0.2').status_code, 200)
+            counts = {dict(labels)['outcome']: row[0] for (name, labels), row in metrics._values.items()
+                      if name == 'findhome_throttle_requests_total'}
+        self.assertEqual(counts, {'allowed': 4, 'user_limited': 2, 'ip_limited': 1})
+        self.assertEqual(ChatMessage.objects.count(), 4)
+
+    def test_buckets_refill_in_a_shared_file_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+        renter = self.renters[0]
+        with self.settings(CACHES={**settings.CACHES, 'throttle': file_cache}, HOME_THROTTLE_PROXY_COUNT=1), \
+                patch('home.throttle.time.time', return_value=1000.0) as clock:
+            # The proxy appends the address it saw; anything before that is the client's say-so.
+            forwarded = {'HTTP_X_FORWARDED_FOR': '198.51.100.1, 203.0.113.7'}
+            self.assertEqual([self.send(renter, **forwarded).status_code for _ in range(3)], [200, 200, 429])
+            clock.return_value = 1030.0
+            self.assertEqual([self.send(renter, **forwarded).status_code for _ in range(2)], [200, 429])
+            self.assertTrue(throttle.get_cache().has_key('chat:ip:203.0.113.7'))
+
+    def test_spoofed_forwarded_for_is_ignored_without_proxies(self):
+        self.assertEqual(settings.HOME_THROTTLE_PROXY_COUNT, 0)
+        first, second = self.renters
+        spoofed = ({'REMOTE_ADDR': '198.51.100.9', 'HTTP_X_FORWARDED_FOR': f'203.0.113.{i}'} for i in range(10))
+        self.assertEqual([self.send(first, **next(spoofed)).status_code for _ in range(2)], [200, 200])
+        # A fresh account and a fresh header each time, but the same connection: one address bucket.
+        self.assertEqual([self.send(second, **next(spoofed)).status_code for _ in range(2)], [200, 429])
+        self.assertTrue(throttle.get_cache().has_key('chat:ip:198.51.100.9'))
+
+    def test_too_few_hops_leaves_only_the_user_buckets(self):
+        first, second = self.renters
+        with self.settings(HOME_THROTTLE_PROXY_COUNT=2):
+            # Only one proxy appended an address, so none of it can be trusted.
+            forwarded = {'REMOTE_ADDR': '10.0.0.1', 'HTTP_X_FORWARDED_FOR': '203.0.113.7'}
+            self.assertEqual([self.send(first, **forwarded).status_code for _ in range(3)], [200, 200, 429])
+            self.assertEqual([self.send(second, **forwarded).status_code for _ in range(3)], [200, 200, 429])
+        self.assertFalse(throttle.get_cache().has_key('chat:ip:10.0.0.1'))
+        self.assertFalse(throttle.get_cache().has_key('chat:ip:203.0.113.7'))
 
-# Create your tests here.
+    def test_disabled_or_unlisted_scopes_are_not_limited(self):
+        self.client.force_login(self.renters[0])
+        url = reverse('save_listing', args=[self.listing.pk])
+        self.assertEqual({self.client.post(url, HTTP_HOST='localhost').status_code for _ in range(5)}, {200})
+        with self.settings(HOME_THROTTLE_ENABLED=False):
+            self.assertEqual({self.send(self.renters[0]).status_code for _ in range(4)}, {200})
@@ -0,0 +1,129 @@
+"""Rate limits for the views that write on every POST.
+
+Each limited view belongs to a scope (``chat``, ``comment``, ``report``,
+``save``, ``interest``) with two token buckets per caller: one for the
+user and one for the client address, so neither a single account nor a
+bot rotating through accounts can write faster than the scope allows. A
+bucket holds up to ``N`` tokens and refills at ``N`` per period; a request
+takes one token from both buckets or, if either is empty, is refused with
+a 429 JSON response and a Retry-After header. Rates are set per scope in
+``HOME_THROTTLE_RATES``, e.g. ``{'user': '30/min', 'ip': '120/min'}``.
+Where the client address cannot be trusted (see ``client_ip``) only the
+user bucket applies.
+
+Buckets live in the ``THROTTLE_CACHE`` alias as (tokens, timestamp)
+pairs, read and written with one ``get_many`` and one ``set_many`` per
+request, and expire once they would be full again. The default LocMemCache
+limits each worker separately; point THROTTLE_CACHE_BACKEND at a shared
+cache (database, Redis, Memcached) to limit across workers. Buckets are
+not locked, so concurrent requests from one caller can occasionally both
+take the last token.
+
+Every decision is counted in ``findhome_throttle_requests_total`` on
+/metrics, by scope and outcome.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from . import metrics
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def get_cache():
+    return caches[settings.THROTTLE_CACHE]
+
+
+def parse_rate(rate):
+    """(capacity, tokens per second) of a rate such as ``'30/min'``"""
+    count, _, period = rate.partition('/')
+    count = int(count)
+    if count <= 0 or period not in PERIODS:
+        raise ValueError(f'Invalid rate {rate!r}')
+    return count, count / PERIODS[period]
+
+
+def client_ip(request):
+    """The caller's address, skipping the HOME_THROTTLE_PROXY_COUNT proxies in front of us
+
+    Without proxies X-Forwarded-For is ignored, since any client can send
+    it. None when the header has fewer hops than the configured proxies, so
+    the address cannot be trusted.
+    """
+    proxies = settings.HOME_THROTTLE_PROXY_COUNT
+    if not proxies:
+        return request.META.get('REMOTE_ADDR') or None
+    header = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    forwarded = [ip.strip() for ip in header.split(',') if ip.strip()]
+    return forwarded[-proxies] if len(forwarded) >= proxies else None
+
+
+def _take(bucket, capacity, refill, now):
+    """The bucket after taking a token, or None and the seconds until one is free"""
+    tokens, updated = bucket or (capacity, now)
+    tokens = min(capacity, tokens + max(now - updated, 0) * refill)
+    if tokens < 1:
+        return None, (1 - tokens) / refill
+    return (tokens - 1, now), 0
+
+
+def check(scope, request):
+    """Take a token for ``request`` from each of ``scope``'s buckets; returns (limited_by, retry_after)
+
+    ``limited_by`` is None when the request may go ahead, otherwise the
+    bucket that is empty (``'user'`` or ``'ip'``), and nothing is taken.
+    """
+    rates = settings.HOME_THROTTLE_RATES.get(scope)
+    if not settings.HOME_THROTTLE_ENABLED or not rates:
+        return None, 0
+    callers = {}
+    ip = client_ip(request)
+    if ip:
+        callers['ip'] = ip
+    if request.user.is_authenticated:
+        callers['user'] = request.user.pk
+    keys = {kind: f'{scope}:{kind}:{callers[kind]}' for kind in rates if kind in callers}
+    cache = get_cache()
+    buckets = cache.get_many(keys.values())
+    now = time.time()
+    updates = {}
+    timeouts = {}
+    for kind, key in keys.items():
+        capacity, refill = parse_rate(rates[kind])
+        bucket, retry_after = _take(buckets.get(key), capacity, refill, now)
+        if bucket is None:
+            return kind, retry_after
+        updates[key] = bucket
+        timeouts[key] = math.ceil((capacity - bucket[0]) / refill) + 1
+    # set_many takes one timeout; the longest keeps every bucket until it is full.
+    cache.set_many(updates, timeout=max(timeouts.values(), default=None))
+    return None, 0
+
+
+def throttle(scope):
+    """Refuse requests to the view with a 429 once the caller exhausts ``scope``'s rate"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            limited_by, retry_after = check(scope, request)
+            metrics.increment(
+                'findhome_throttle_requests_total',
+                (('scope', scope), ('outcome', f'{limited_by}_limited' if limited_by else 'allowed')),
+            )
+            if limited_by:
+                seconds = max(math.ceil(retry_after), 1)
+                response = JsonResponse({
+                    'success': False,
+                    'message': f'Too many requests. Please try again in {seconds} seconds.',
+                    'retry_after': seconds,
+                }, status=429)
+                response['Retry-After'] = str(seconds)
+                return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
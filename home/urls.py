@@ -9,14 +9,24 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('create-listing/', views.create_listing, name='create_listing'),
+    path('listings/state/', views.listing_state, name='listing_state'),
+    path('areas/suggest/', views.area_suggestions, name='area_suggestions'),
     path('listing/<int:pk>/', views.listing_detail, name='listing_detail'),
     path('listing/<int:pk>/save/', views.save_listing, name='save_listing'),
     path('listing/<int:pk>/interest/', views.show_interest, name='show_interest'),
     path('listing/<int:pk>/comment/', views.add_comment, name='add_comment'),
+    path('listing/<int:pk>/comments/', views.listing_comments, name='listing_comments'),
     path('listing/<int:pk>/update-status/', views.update_listing_status, name='update_listing_status'),
     path('listing/<int:pk>/report/', views.report_listing, name='report_listing'),
+    path('inbox/', views.chat_inbox, name='chat_inbox'),
     path('listing/<int:pk>/chat/', views.chat_view, name='chat_view'),
+    path('listing/<int:pk>/chat/updates/', views.chat_updates, name='chat_updates'),
+    path('listing/<int:pk>/chat/history/', views.chat_history, name='chat_history'),
     path('listing/<int:pk>/send-message/', views.send_message, name='send_message'),
+    path('events/', views.events, name='events'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
     path('admin/report/<int:pk>/resolve/', views.admin_resolve_report, name='resolve_report'),
     path('admin/toggle-user/<int:pk>/', views.toggle_user_status, name='toggle_user_status'),
+    path('dashboard/export/<slug:kind>.<slug:fmt>', views.export_data, name='export_data'),
+    path('dashboard/reports/moderate/', views.moderate_reports, name='moderate_reports'),
 ]
\ No newline at end of file
@@ -2,47 +2,41 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q
-from django.core.paginator import Paginator
-from django.views.decorators.http import require_POST
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.http import (
+    Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
+from django.db.models import Q, Value
+from django.views.decorators.http import require_GET, require_POST
 from .models import *
 from .forms import *
-from django.utils import timezone
+from .events import publish_to_user
+from .images import image_extension, stage_images
+from .pagination import CursorPaginator
+from . import autocomplete, counters, exports, geo, inbox, metrics, moderation, search_cache
+from .profiles import get_profile, role_of, role_required
+from .throttle import throttle
+from django.utils import dateformat, timezone
+from django.utils.crypto import constant_time_compare
 
 
 def home(request):
     """Homepage with search functionality"""
     form = SearchForm(request.GET)
-    listings = HouseListing.objects.filter(status='available', is_reported=False)
+    data = form.cleaned_data if form.is_valid() else {}
+    listings = search_cache.cached_listing_page(data, request.GET.get('cursor'), 12)
+    if data.get('lat') is not None:
+        for listing in listings:
+            listing.distance_km = geo.distance_km(data['lat'], data['lng'], listing.latitude, listing.longitude)
     
-    if form.is_valid():
-        query = form.cleaned_data.get('query')
-        house_type = form.cleaned_data.get('house_type')
-        min_rent = form.cleaned_data.get('min_rent')
-        max_rent = form.cleaned_data.get('max_rent')
-        
-        if query:
-            listings = listings.filter(
-                Q(area__icontains=query) | 
-                Q(address__icontains=query) | 
-                Q(title__icontains=query)
-            )
-        
-        if house_type:
-            listings = listings.filter(house_type=house_type)
-        
-        if min_rent:
-            listings = listings.filter(rent__gte=min_rent)
-        
-        if max_rent:
-            listings = listings.filter(rent__lte=max_rent)
-    
-    paginator = Paginator(listings, 12)
-    page = request.GET.get('page')
-    listings = paginator.get_page(page)
-    
-    return render(request, 'home.html', {'form': form, 'listings': listings})
+    context = {
+        'form': form,
+        'listings': listings,
+        'facets': search_cache.cached_facets(data),
+        'radius_km': data.get('radius_km'),
+    }
+    return render(request, 'home.html', context)
 
 def register(request):
     """User registration"""
@@ -101,56 +95,62 @@ def logout_view(request):
 @login_required
 def dashboard(request):
     """User dashboard based on user type"""
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile(request.user)
     
     if profile.user_type == 'renter':
-        saved_listings = SavedListing.objects.filter(user=request.user)
-        interests = Interest.objects.filter(renter=request.user)
+        saved_listings = SavedListing.objects.filter(user=request.user).select_related('listing__cover_image')
+        interests = Interest.objects.filter(renter=request.user).select_related('listing__cover_image')
         context = {'saved_listings': saved_listings, 'interests': interests}
         return render(request, 'dashboard/renter.html', context)
     
     elif profile.user_type == 'owner':
-        listings = HouseListing.objects.filter(owner=request.user)
-        interests = Interest.objects.filter(listing__owner=request.user, is_read=False)
+        listings = HouseListing.objects.filter(owner=request.user, removed_at=None).select_related('cover_image')
+        interests = Interest.objects.filter(listing__owner=request.user, is_read=False).select_related('renter', 'listing')
         context = {'listings': listings, 'new_interests': interests}
         return render(request, 'dashboard/owner.html', context)
     
     else:  # admin
-        # Get today's date for filtering
-        today = timezone.now().date()
-        
-        # Calculate statistics
-        total_listings = HouseListing.objects.count()
-        total_users = User.objects.filter(userprofile__user_type__in=['renter', 'owner']).count()
-        pending_reports = Report.objects.filter(is_resolved=False).count()
-        new_listings_today = HouseListing.objects.filter(created_at__date=today).count()
+        # Statistics come from the materialized counters in one query
+        context = counters.dashboard_counts()
         
         # Get recent data
-        recent_listings = HouseListing.objects.select_related('owner').order_by('-created_at')[:10]
-        reports = Report.objects.filter(is_resolved=False).select_related('listing', 'reporter').order_by('-created_at')
+        recent_listings = HouseListing.objects.filter(removed_at=None).select_related('owner', 'cover_image').order_by('-created_at')[:10]
+        reported = moderation.reported_listings(request.GET.get('reports'))
         recent_users = User.objects.filter(
             userprofile__user_type__in=['renter', 'owner']
         ).select_related('userprofile').order_by('-date_joined')[:10]
         
-        context = {
-            'total_listings': total_listings,
-            'total_users': total_users,
-            'pending_reports': pending_reports,
-            'new_listings_today': new_listings_today,
+        context.update({
             'recent_listings': recent_listings,
-            'reports': reports,
+            'reported_listings': reported,
+            'report_hide_threshold': settings.HOME_REPORT_HIDE_THRESHOLD,
             'recent_users': recent_users,
-        }
+            'search_cache_stats': search_cache.stats(),
+            'export_kinds': [('listings', 'Listings'), ('reports', 'Reports'), ('chat', 'Chat')],
+        })
         return render(request, 'dashboard/admin.html', context)
     
-@login_required
+@role_required('admin')
+@require_GET
+def export_data(request, kind, fmt):
+    """Stream listings, reports or chat messages as CSV or JSONL (Admin only)"""
+    export = exports.EXPORTS.get(kind)
+    if export is None or fmt not in exports.FORMATS:
+        raise Http404('No such export.')
+    try:
+        rows = export.rows(request.GET)
+    except ValidationError as e:
+        return JsonResponse({'errors': e.message_dict}, status=400)
+    
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(exports.encode(export, rows, fmt), content_type=content_type)
+    filename = f'{kind}-{timezone.localdate():%Y%m%d}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+    
+@role_required('admin')
 def toggle_user_status(request, pk):
     """Toggle user active status (Admin only)"""
-    profile = get_object_or_404(UserProfile, user=request.user)
-    if profile.user_type != 'admin':
-        messages.error(request, 'Unauthorized access.')
-        return redirect('home')
-    
     user = get_object_or_404(User, pk=pk)
     
     if request.method == 'POST':
@@ -188,27 +188,25 @@ def toggle_user_status(request, pk):
     
 #     return redirect('dashboard')
 
-@login_required
+@role_required('owner', message='Only owners can create listings.')
 def create_listing(request):
     """Create new house listing (Owner only)"""
-    profile = get_object_or_404(UserProfile, user=request.user)
-    if profile.user_type != 'owner':
-        messages.error(request, 'Only owners can create listings.')
-        return redirect('home')
-    
     if request.method == 'POST':
         form = HouseListingForm(request.POST)
         images = request.FILES.getlist('images')
+        for upload in images:
+            if image_extension(upload) is None:
+                form.add_error(None, f'{upload.name} is not a JPEG, PNG or GIF image.')
         
         if form.is_valid():
             listing = form.save(commit=False)
             listing.owner = request.user
             listing.save()
             
-            for image in images:
-                HouseImage.objects.create(listing=listing, image=image)
+            # Photos upload in the background; the listing shows them once ready
+            stage_images(listing, images)
             
-            messages.success(request, 'Listing created successfully!')
+            messages.success(request, 'Listing created successfully! Photos will appear once they finish uploading.')
             return redirect('dashboard')
     else:
         form = HouseListingForm()
@@ -217,8 +215,9 @@ def create_listing(request):
 
 def listing_detail(request, pk):
     """Detailed view of a house listing"""
-    listing = get_object_or_404(HouseListing, pk=pk)
-    comments = listing.comments.filter(parent=None)
+    listing = get_object_or_404(HouseListing.objects.select_related('owner').prefetch_related('images'), pk=pk)
+    comments = comment_threads(listing, None)
+    images = [image for image in listing.images.all() if image.status == 'ready']
     
     # Check if user has saved this listing
     is_saved = False
@@ -227,6 +226,8 @@ def listing_detail(request, pk):
     
     context = {
         'listing': listing,
+        'images': images,
+        'images_processing': any(image.status == 'processing' for image in listing.images.all()),
         'comments': comments,
         'is_saved': is_saved,
         'comment_form': CommentForm(),
@@ -235,8 +236,27 @@ def listing_detail(request, pk):
     
     return render(request, 'listings/detail.html', context)
 
+def comment_threads(listing, cursor, per_page=10):
+    """A page of top-level comments with their replies attached, in two queries"""
+    threads = listing.comments.filter(parent=None).select_related('author').order_by('-created_at', '-id')
+    page = CursorPaginator(threads, per_page).get_page(cursor)
+    replies = {comment.pk: [] for comment in page}
+    for reply in Comment.objects.filter(parent_id__in=replies).select_related('author'):
+        replies[reply.parent_id].append(reply)
+    for comment in page:
+        comment.thread_replies = replies[comment.pk]
+    return page
+
+@require_GET
+def listing_comments(request, pk):
+    """Next page of comment threads for the listing detail page"""
+    listing = get_object_or_404(HouseListing, pk=pk)
+    context = {'listing': listing, 'comments': comment_threads(listing, request.GET.get('cursor'))}
+    return render(request, 'listings/comments.html', context)
+
 @login_required
 @require_POST
+@throttle('save')
 def save_listing(request, pk):
     """Save/unsave a listing"""
     listing = get_object_or_404(HouseListing, pk=pk)
@@ -248,12 +268,40 @@ def save_listing(request, pk):
     
     return JsonResponse({'saved': True})
 
+@login_required
+@require_GET
+def listing_state(request):
+    """Saved/interest state of the given listings for the current user"""
+    ids = [int(pk) for pk in request.GET.get('ids', '').split(',')[:100] if pk.isdigit()]
+    saved = SavedListing.objects.filter(user=request.user, listing_id__in=ids)
+    interested = Interest.objects.filter(renter=request.user, listing_id__in=ids)
+    rows = saved.annotate(kind=Value('saved')).values_list('listing_id', 'kind').union(
+        interested.annotate(kind=Value('interested')).values_list('listing_id', 'kind'),
+        all=True,
+    )
+    
+    state = {'saved': [], 'interested': []}
+    for listing_id, kind in rows:
+        state[kind].append(listing_id)
+    return JsonResponse(state)
+
+@require_GET
+def area_suggestions(request):
+    """Known areas starting with ``q``, busiest first, for the search box"""
+    try:
+        limit = min(max(int(request.GET.get('limit', autocomplete.SUGGESTIONS)), 1), autocomplete.SUGGESTIONS)
+    except ValueError:
+        limit = autocomplete.SUGGESTIONS
+    areas = autocomplete.suggest(request.GET.get('q', '')[:100], limit)
+    return JsonResponse({'areas': [{'area': area, 'count': count} for area, count in areas]})
+
 @login_required
 @require_POST
+@throttle('interest')
 def show_interest(request, pk):
     """Show interest in a listing"""
     listing = get_object_or_404(HouseListing, pk=pk)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_profile(request.user)
     
     if profile.user_type != 'renter':
         return JsonResponse({'error': 'Only renters can show interest'})
@@ -265,12 +313,18 @@ def show_interest(request, pk):
     )
     
     if created:
+        publish_to_user(listing.owner_id, 'interest.created', {
+            'listing': listing.id,
+            'title': listing.title,
+            'renter': request.user.get_full_name() or request.user.username,
+        })
         return JsonResponse({'success': True, 'message': 'Interest shown successfully!'})
     else:
         return JsonResponse({'success': False, 'message': 'You have already shown interest in this property.'})
 
 @login_required
 @require_POST
+@throttle('comment')
 def add_comment(request, pk):
     """Add comment to a listing"""
     listing = get_object_or_404(HouseListing, pk=pk)
@@ -283,7 +337,7 @@ def add_comment(request, pk):
         
         parent_id = request.POST.get('parent_id')
         if parent_id:
-            comment.parent = get_object_or_404(Comment, pk=parent_id)
+            comment.parent = get_object_or_404(Comment, pk=parent_id, listing=listing)
         
         comment.save()
         return JsonResponse({'success': True})
@@ -293,7 +347,7 @@ def add_comment(request, pk):
 @login_required
 def update_listing_status(request, pk):
     """Update listing status (Owner only)"""
-    listing = get_object_or_404(HouseListing, pk=pk, owner=request.user)
+    listing = get_object_or_404(HouseListing, pk=pk, owner=request.user, removed_at=None)
     
     if request.method == 'POST':
         status = request.POST.get('status')
@@ -306,6 +360,7 @@ def update_listing_status(request, pk):
 
 @login_required
 @require_POST
+@throttle('report')
 def report_listing(request, pk):
     """Report a false advertisement"""
     listing = get_object_or_404(HouseListing, pk=pk)
@@ -324,8 +379,8 @@ def report_listing(request, pk):
 @login_required
 def chat_view(request, pk):
     """Chat between renter and owner"""
-    listing = get_object_or_404(HouseListing, pk=pk)
-    profile = get_object_or_404(UserProfile, user=request.user)
+    listing = get_object_or_404(HouseListing.objects.select_related('owner', 'cover_image'), pk=pk)
+    profile = get_profile(request.user)
     
     if profile.user_type == 'renter':
         other_user = listing.owner
@@ -341,31 +396,126 @@ def chat_view(request, pk):
         messages.error(request, 'Unauthorized access.')
         return redirect('listing_detail', pk=pk)
     
-    # Get chat messages
-    messages_list = ChatMessage.objects.filter(
-        listing=listing,
-        sender__in=[request.user, other_user],
-        receiver__in=[request.user, other_user]
-    )
-    
-    # Mark messages as read
-    ChatMessage.objects.filter(
-        listing=listing,
-        sender=other_user,
-        receiver=request.user,
-        is_read=False
-    ).update(is_read=True)
+    # Latest messages only; older ones load from chat_history on scroll
+    page = chat_page(listing, request.user, other_user.id, None)
     
     context = {
         'listing': listing,
         'other_user': other_user,
-        'messages': messages_list,
+        'messages': page,
+        'older_cursor': page.next_cursor,
     }
     
     return render(request, 'chat/chat.html', context)
 
+def chat_page(listing, user, other_user_id, cursor, per_page=50):
+    """A page of the conversation, newest first from ``cursor``, in display order
+    
+    Only the messages on the page are marked read.
+    """
+    conversation = ChatMessage.objects.filter(
+        Q(sender=user, receiver_id=other_user_id) | Q(sender_id=other_user_id, receiver=user),
+        listing=listing,
+    ).order_by('-timestamp', '-id')
+    page = CursorPaginator(conversation, per_page).get_page(cursor)
+    unread = [m.id for m in page if m.receiver_id == user.id and not m.is_read]
+    if unread:
+        ChatMessage.objects.filter(id__in=unread).update(is_read=True)
+    page.object_list.reverse()
+    return page
+
+@login_required
+@require_GET
+def chat_history(request, pk):
+    """Messages older than ``cursor`` in a chat, as JSON, oldest first"""
+    listing = get_object_or_404(HouseListing.objects.only('owner_id'), pk=pk)
+    profile = get_profile(request.user)
+    
+    if profile.user_type == 'renter':
+        other_user_id = listing.owner_id
+    elif profile.user_type == 'owner' and listing.owner_id == request.user.id:
+        other_user_id = request.GET.get('renter_id', '')
+        if not other_user_id.isdigit():
+            return JsonResponse({'error': 'Renter not specified.'}, status=400)
+    else:
+        return JsonResponse({'error': 'Unauthorized access.'}, status=403)
+    
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return JsonResponse({'error': 'Cursor not specified.'}, status=400)
+    page = chat_page(listing, request.user, other_user_id, cursor)
+    return JsonResponse({
+        'messages': [chat_message_json(m, request.user) for m in page],
+        'cursor': page.next_cursor,
+    })
+
+@login_required
+@require_GET
+def chat_inbox(request):
+    """The user's conversations, latest first, with unread counts"""
+    conversations = inbox.get_page(request.user, request.GET.get('cursor'))
+    return render(request, 'chat/inbox.html', {'conversations': conversations})
+
+def chat_message_json(message, user):
+    """Client-side representation of a ChatMessage"""
+    timestamp = timezone.localtime(message.timestamp)
+    return {
+        'id': message.id,
+        'message': message.message,
+        'sent': message.sender_id == user.id,
+        'timestamp': timestamp.isoformat(),
+        'timestamp_display': dateformat.format(timestamp, 'M d, H:i'),
+    }
+
+@login_required
+@require_GET
+def chat_updates(request, pk):
+    """Chat messages newer than the client's last one, as JSON
+    
+    The client sends the id of the last message it has as ``If-None-Match``
+    (or ``?after=``). With nothing newer the answer is an empty 304.
+    """
+    listing = get_object_or_404(HouseListing.objects.only('owner_id'), pk=pk)
+    profile = get_profile(request.user)
+    
+    if profile.user_type == 'renter':
+        other_user_id = listing.owner_id
+    elif profile.user_type == 'owner' and listing.owner_id == request.user.id:
+        other_user_id = request.GET.get('renter_id', '')
+        if not other_user_id.isdigit():
+            return JsonResponse({'error': 'Renter not specified.'}, status=400)
+    else:
+        return JsonResponse({'error': 'Unauthorized access.'}, status=403)
+    
+    after = request.GET.get('after') or request.headers.get('If-None-Match', '').strip('W/"')
+    after = int(after) if after.isdigit() else 0
+    participants = [request.user.id, other_user_id]
+    new_messages = list(ChatMessage.objects.filter(
+        listing=listing,
+        sender_id__in=participants,
+        receiver_id__in=participants,
+        id__gt=after,
+    ).order_by('id')[:100])
+    
+    if not new_messages:
+        response = HttpResponseNotModified()
+    else:
+        # Mark only what this response delivers as read
+        delivered = [m.id for m in new_messages if m.receiver_id == request.user.id and not m.is_read]
+        if delivered:
+            ChatMessage.objects.filter(id__in=delivered).update(is_read=True)
+        after = new_messages[-1].id
+        response = JsonResponse({
+            'messages': [chat_message_json(m, request.user) for m in new_messages],
+            'last_id': after,
+        })
+    response['ETag'] = f'"{after}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
 @login_required
 @require_POST
+@throttle('chat')
 def send_message(request, pk):
     """Send chat message"""
     listing = get_object_or_404(HouseListing, pk=pk)
@@ -375,32 +525,57 @@ def send_message(request, pk):
     if receiver_id and message_content:
         receiver = get_object_or_404(User, pk=receiver_id)
         
-        ChatMessage.objects.create(
+        message = ChatMessage.objects.create(
             listing=listing,
             sender=request.user,
             receiver=receiver,
             message=message_content
         )
+        publish_to_user(receiver.id, 'chat.message', {
+            'id': message.id,
+            'listing': listing.id,
+            'sender': request.user.id,
+        })
         
-        return JsonResponse({'success': True})
+        return JsonResponse({'success': True, 'id': message.id})
     
     return JsonResponse({'success': False})
 
+def events(request):
+    """Server-sent event stream placeholder for WSGI deployments
+    
+    Under ASGI, find_home.asgi sends /events/ to home.events.events_app
+    before Django sees it. A WSGI worker would be held for the life of the
+    stream, so here clients are told to keep polling instead.
+    """
+    return JsonResponse({'error': 'Push notifications are not available.'}, status=503)
+
+@require_GET
+def prometheus_metrics(request):
+    """Request metrics of every worker in the Prometheus text format
+    
+    Open to Prometheus with ``Authorization: Bearer <HOME_METRICS_TOKEN>``
+    and to logged-in admins.
+    """
+    token = settings.HOME_METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    allowed = bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+    if not allowed and request.user.is_authenticated:
+        allowed = role_of(request.user) == 'admin'
+    if not allowed:
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Admin Views
-@login_required
+@role_required('admin')
 def admin_resolve_report(request, pk):
     """Admin resolves a report"""
-    profile = get_object_or_404(UserProfile, user=request.user)
-    if profile.user_type != 'admin':
-        messages.error(request, 'Unauthorized access.')
-        return redirect('home')
-    
     report = get_object_or_404(Report, pk=pk)
     
     if request.method == 'POST':
         action = request.POST.get('action')
         if action == 'remove':
-            report.listing.delete()
+            moderation.remove([report.listing_id])
             messages.success(request, 'False advertisement removed.')
         elif action == 'dismiss':
             report.is_resolved = True
@@ -408,3 +583,19 @@ def admin_resolve_report(request, pk):
             messages.success(request, 'Report dismissed.')
     
     return redirect('dashboard')
+
+@role_required('admin')
+@require_POST
+def moderate_reports(request):
+    """Dismiss or remove many reported listings at once (Admin only)"""
+    listing_ids = [int(pk) for pk in request.POST.getlist('listings') if pk.isdigit()]
+    action = request.POST.get('action')
+    if not listing_ids:
+        messages.error(request, 'Select at least one listing.')
+    elif action == 'dismiss':
+        resolved = moderation.dismiss(listing_ids)
+        messages.success(request, f'Dismissed {resolved} reports on {len(listing_ids)} listings.')
+    elif action == 'remove':
+        removed = moderation.remove(listing_ids)
+        messages.success(request, f'Removed {removed} listings.')
+    return redirect('dashboard')